@@ -3,6 +3,13 @@ const BACKEND_URL = 'http://localhost:5001'; // Backend API
 
 let allResults = [];
 
+// While streaming: how many of allResults already have a card and are counted in
+// streamStats, and the animation frame that renders the rest
+let renderedCount = 0;
+let talliedCount = 0;
+let renderFrame = null;
+let streamStats = newStreamStats();
+
 // DOM Elements
 const analyzeBtn = document.getElementById('analyzeBtn');
 const refreshBtn = document.getElementById('refreshBtn');
@@ -29,24 +36,58 @@ async function analyzeWebsites() {
     const hours = timeLimitSelect.value;
     const timeText = hours ? `past ${getTimeText(hours)}` : 'all time';
     showStatus(`Analyzing websites from ${timeText}...`, 'info');
+    allResults = [];
+    renderedCount = 0;
+    talliedCount = 0;
+    streamStats = newStreamStats();
+    resultsDiv.innerHTML = '';
     
     try {
         const url = hours 
-            ? `${API_BASE_URL}/analyze?hours=${hours}`
-            : `${API_BASE_URL}/analyze`;
+            ? `${API_BASE_URL}/analyze/stream?hours=${hours}`
+            : `${API_BASE_URL}/analyze/stream`;
         
+        // Results arrive as NDJSON: one activity per line, then a summary line with "done"
         const response = await fetch(url);
-        const data = await response.json();
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let summary = null;
         
-        if (data.error) {
-            throw new Error(data.error);
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            
+            const items = [];
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const item = JSON.parse(line);
+                if (item.done) {
+                    summary = item;
+                } else {
+                    items.push(item);
+                }
+            }
+            queueResults(items, timeText);
         }
         
-        allResults = data.results || [];
-        displayResults(allResults);
-        updateStats(allResults);
+        if (summary && summary.error) {
+            throw new Error(summary.error);
+        }
+        
+        // One full render at the end; during the stream only new cards were appended
+        cancelAnimationFrame(renderFrame);
+        renderFrame = null;
+        filterResults();
         populateCategoryFilter(allResults);
-        showStatus(`✓ Successfully analyzed ${data.total} websites from ${timeText}`, 'success');
+        if (allResults.length > 0) {
+            updateStats(allResults);
+        }
+        showStatus(`✓ Successfully analyzed ${allResults.length} websites from ${timeText}`, 'success');
         
     } catch (error) {
         console.error('Error:', error);
@@ -90,7 +131,11 @@ function displayResults(results) {
     resultsContainer.style.display = 'block';
     statsGrid.style.display = 'grid';
     
-    resultsDiv.innerHTML = results.map(result => `
+    resultsDiv.innerHTML = results.map(renderCard).join('');
+}
+
+function renderCard(result) {
+    return `
         <div class="result-card">
             <div class="result-header">
                 <div class="result-title">${escapeHtml(result.title || 'Untitled')}</div>
@@ -100,6 +145,7 @@ function displayResults(results) {
             </div>
             <div class="result-url">🔗 ${escapeHtml(result.url)}</div>
             <div class="result-description">"${escapeHtml(result.description)}"</div>
+            ${formatAlternatives(result.alternatives)}
             <div class="result-footer">
                 <span>User: ${result.userId}</span>
                 <div style="display: flex; align-items: center; gap: 10px;">
@@ -110,17 +156,82 @@ function displayResults(results) {
                 </div>
             </div>
         </div>
-    `).join('');
+    `;
 }
 
-function updateStats(results) {
-    const total = results.length;
-    const avgConfidence = (results.reduce((sum, r) => sum + r.confidence, 0) / total).toFixed(1);
+function queueResults(items, timeText) {
+    if (items.length === 0) return;
+    for (const item of items) {
+        allResults.push(item);
+    }
+    // Renders at most once per frame, however many chunks arrive in between
+    if (renderFrame === null) {
+        renderFrame = requestAnimationFrame(() => renderPending(timeText));
+    }
+}
+
+function renderPending(timeText) {
+    renderFrame = null;
+    // A filter change meanwhile re-rendered every card, so cards and stats can be at different points
+    const unrendered = allResults.slice(renderedCount);
+    const items = allResults.slice(talliedCount);
+    renderedCount = talliedCount = allResults.length;
+    
+    const searchTerm = searchInput.value.toLowerCase();
+    const selectedCategory = categoryFilter.value;
+    const visible = unrendered.filter(result => matchesFilters(result, searchTerm, selectedCategory));
+    if (visible.length > 0) {
+        emptyState.style.display = 'none';
+        resultsContainer.style.display = 'block';
+        resultsDiv.insertAdjacentHTML('beforeend', visible.map(renderCard).join(''));
+    }
     
+    let newCategory = false;
+    for (const result of items) {
+        streamStats.confidenceSum += result.confidence;
+        newCategory = newCategory || !(result.category in streamStats.categoryCounts);
+        streamStats.categoryCounts[result.category] = (streamStats.categoryCounts[result.category] || 0) + 1;
+    }
+    streamStats.total += items.length;
+    statsGrid.style.display = 'grid';
+    renderStats(streamStats);
+    if (newCategory) {
+        populateCategoryFilter(allResults);
+    }
+    showStatus(`Analyzed ${allResults.length} websites from ${timeText}...`, 'info');
+}
+
+function newStreamStats() {
+    return { total: 0, confidenceSum: 0, categoryCounts: {} };
+}
+
+function formatAlternatives(alternatives) {
+    if (!alternatives || alternatives.length === 0) {
+        return '';
+    }
+    // Uncalibrated models give no probability: their confidence is not on a probability scale
+    const items = alternatives
+        .map(alt => alt.probability == null
+            ? escapeHtml(alt.category)
+            : `${escapeHtml(alt.category)} (${Math.round(alt.probability * 100)}%)`)
+        .join(', ');
+    return `<div class="result-alternatives">Also likely: ${items}</div>`;
+}
+
+function updateStats(results) {
     const categoryCounts = results.reduce((acc, r) => {
         acc[r.category] = (acc[r.category] || 0) + 1;
         return acc;
     }, {});
+    renderStats({
+        total: results.length,
+        confidenceSum: results.reduce((sum, r) => sum + r.confidence, 0),
+        categoryCounts
+    });
+}
+
+function renderStats({ total, confidenceSum, categoryCounts }) {
+    const avgConfidence = (confidenceSum / total).toFixed(1);
     
     const topCategory = Object.keys(categoryCounts).reduce((a, b) => 
         categoryCounts[a] > categoryCounts[b] ? a : b
@@ -133,28 +244,36 @@ function updateStats(results) {
 
 function populateCategoryFilter(results) {
     const categories = [...new Set(results.map(r => r.category))].sort();
+    const selected = categoryFilter.value;
     categoryFilter.innerHTML = '<option value="">All Categories</option>' + 
         categories.map(cat => `<option value="${cat}">${cat}</option>`).join('');
+    // Keep the user's choice while streamed results keep adding categories
+    if (categories.includes(selected)) {
+        categoryFilter.value = selected;
+    }
 }
 
 function filterResults() {
     const searchTerm = searchInput.value.toLowerCase();
     const selectedCategory = categoryFilter.value;
     
-    const filtered = allResults.filter(result => {
-        const matchesSearch = !searchTerm || 
-            result.url.toLowerCase().includes(searchTerm) ||
-            result.title.toLowerCase().includes(searchTerm) ||
-            result.description.toLowerCase().includes(searchTerm);
-        
-        const matchesCategory = !selectedCategory || result.category === selectedCategory;
-        
-        return matchesSearch && matchesCategory;
-    });
+    const filtered = allResults.filter(result => matchesFilters(result, searchTerm, selectedCategory));
+    renderedCount = allResults.length;
     
     displayResults(filtered);
 }
 
+function matchesFilters(result, searchTerm, selectedCategory) {
+    const matchesSearch = !searchTerm || 
+        result.url.toLowerCase().includes(searchTerm) ||
+        result.title.toLowerCase().includes(searchTerm) ||
+        result.description.toLowerCase().includes(searchTerm);
+    
+    const matchesCategory = !selectedCategory || result.category === selectedCategory;
+    
+    return matchesSearch && matchesCategory;
+}
+
 function setLoading(isLoading) {
     analyzeBtn.disabled = isLoading;
     const btnText = analyzeBtn.querySelector('.btn-text');
@@ -1,27 +1,45 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from pymongo import UpdateOne
 from bson import ObjectId
-from typing import List
-import pickle
-import re
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+import json
+import logging
+from collections import OrderedDict
 import os
-from dotenv import load_dotenv
-import google.generativeai as genai
-from nltk.stem.porter import PorterStemmer
-from nltk.corpus import stopwords
-import nltk
-from datetime import datetime, timedelta
 import time
+from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urlparse
-
-# Download required NLTK data
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
+import description_cache as desc_cache
+import description_fetcher as desc_fetcher
+from description_providers import DomainLexicon, LocalProvider, GeminiProvider
+import domain_index as dom_index
+import classifier
+import model_api
+from classifier import classify_batch, prediction_cache
+from jobs import JobManager
+from compaction import compact, CompactionRunning, TOMBSTONE_COLLECTION, TOMBSTONE_TTL_DAYS, LOCK_COLLECTION
+from ingest import WriteBehindBuffer
+import export as columnar_export
+from warmup import Warmup
+import metrics
+from metrics import STAGE_SECONDS, CACHE_LOOKUPS, ACTIVITIES_ANALYZED, DESCRIPTIONS
+from database import client, db, collection, find_batches, find_all, MONGO_URI, MONGO_QUERY_TIMEOUT_MS
 
 # Load environment variables
 load_dotenv()
 
+# Per-page analysis output is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger().setLevel(LOG_LEVEL)
+logger = logging.getLogger("analyse")
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -33,120 +51,487 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# MongoDB Connection
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["third_eye"]  # Database name: third_eye
-collection = db["activities"]  # Collection name: activities
-
-# Configure Gemini API
+# Gemini API; the client is configured during warm-up
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    model_gemini = genai.GenerativeModel('gemini-2.5-flash')  # Updated to stable flash model
-
-# Load classification model - using the trained vectorizer and model
-print("Loading classification model...")
-vectorizer = pickle.load(open('vectorizer.pkl', 'rb'))
-model = pickle.load(open('model.pkl', 'rb'))
-print("✓ Model loaded successfully!\n")
-
-# Preprocessing setup
-port_stemmer = PorterStemmer()
-stop_words = set(stopwords.words('english'))
-
-def preprocessing(text):
-    """Transform text using the same preprocessing as training"""
-    text = text.lower()
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"[^a-zA-Z]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r'[^\w\s,.!?]', '', text)
-    text = text.split()
-    text = [port_stemmer.stem(word) for word in text if not word in stop_words]
-    return " ".join(text)
+model_gemini = None
 
-def get_website_description(url: str, title: str = "") -> str:
-    # Fallback: extract domain and use title if Gemini fails
+# Activities with a result from an older model that one analysis run may reclassify
+ANALYZE_BACKFILL_LIMIT = int(os.getenv("ANALYZE_BACKFILL_LIMIT", "1000"))
+
+# /data page sizes
+DATA_PAGE_SIZE = int(os.getenv("DATA_PAGE_SIZE", "100"))
+DATA_PAGE_MAX = int(os.getenv("DATA_PAGE_MAX", "1000"))
+
+# Unique pages remembered across chunks of one /analyze/stream run
+STREAM_MEMO_ENTRIES = int(os.getenv("STREAM_MEMO_ENTRIES", "10000"))
+
+# Background analysis jobs: concurrent jobs per process, and how long a silent job keeps its claim
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "1"))
+ANALYSIS_JOB_LEASE_SECONDS = int(os.getenv("ANALYSIS_JOB_LEASE_SECONDS", "120"))
+
+# Session compaction: same-URL activities at most COMPACTION_GAP_SECONDS apart become one
+# document. Merged raw records are copied to COMPACTION_RAW_COLLECTION when
+# COMPACTION_KEEP_RAW is set. With COMPACTION_INTERVAL_MINUTES > 0 every server also
+# compacts the last COMPACTION_LOOKBACK_HOURS on that schedule; POST /compact runs it on demand.
+# A lease in COMPACTION_LOCK_COLLECTION lets only one of them run at a time.
+COMPACTION_GAP_SECONDS = float(os.getenv("COMPACTION_GAP_SECONDS", "60"))
+COMPACTION_KEEP_RAW = os.getenv("COMPACTION_KEEP_RAW", "false").lower() in ("1", "true", "yes")
+COMPACTION_RAW_COLLECTION = os.getenv("COMPACTION_RAW_COLLECTION", "activities_raw")
+COMPACTION_INTERVAL_MINUTES = float(os.getenv("COMPACTION_INTERVAL_MINUTES", "0"))
+COMPACTION_LOOKBACK_HOURS = float(os.getenv("COMPACTION_LOOKBACK_HOURS", "24"))
+
+# /ingest write-behind queue: activities per request, queued activities before clients get
+# 429/503, and the batch size / age that triggers an insert_many
+INGEST_BATCH_MAX = int(os.getenv("INGEST_BATCH_MAX", "5000"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "50000"))
+INGEST_FLUSH_SIZE = int(os.getenv("INGEST_FLUSH_SIZE", "1000"))
+INGEST_FLUSH_MS = float(os.getenv("INGEST_FLUSH_MS", "500"))
+
+# Persistent cache of Gemini descriptions keyed by normalized URL + title; opened during warm-up
+description_cache = None
+
+# Where descriptions for uncached pages come from:
+#   gemini  every page goes to Gemini (the title or domain without an API key)
+#   local   every page is described offline from its URL and the domain lexicon
+#   tiered  pages on known domains are described locally when the classifier is
+#           confident enough about the result; the rest go to Gemini
+DESCRIPTION_PROVIDER = os.getenv("DESCRIPTION_PROVIDER", "tiered").lower()
+DESCRIPTION_LOCAL_MIN_CONFIDENCE = float(os.getenv("DESCRIPTION_LOCAL_MIN_CONFIDENCE", "50"))
+
+# domain -> keywords, learned from every Gemini description (and the ones already cached)
+domain_lexicon = DomainLexicon(
+    keywords_per_domain=int(os.getenv("DESCRIPTION_LEXICON_KEYWORDS", "15")),
+    min_samples=int(os.getenv("DESCRIPTION_LEXICON_MIN_SAMPLES", "2")),
+)
+local_provider = LocalProvider(domain_lexicon)
+
+# domain -> (category, confidence, model version) from the dataset labels and past runs;
+# confident domains are resolved without a description or the model. Loaded during warm-up.
+DOMAIN_INDEX_ENABLED = os.getenv("DOMAIN_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+domain_index = None
+
+def initialize():
+    """Blocking startup work, run once in a thread by the warm-up task
+
+    Returns:
+        dict: milliseconds spent per step
+    """
+    global model_gemini, description_cache, domain_index
+    timings = {}
+    # Opened here rather than at import: the domain index reads its whole table into memory
+    start = time.perf_counter()
+    if description_cache is None:
+        description_cache = desc_cache.from_env()
+    if domain_index is None:
+        domain_index = dom_index.from_env()
+    timings["cachesMs"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    # A client set before warm-up (the benchmark's stub) is kept
+    if GEMINI_API_KEY and model_gemini is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        model_gemini = genai.GenerativeModel('gemini-2.5-flash')  # Updated to stable flash model
+    timings["geminiMs"] = round((time.perf_counter() - start) * 1000, 1)
+    # Results persisted on activities are tagged with the model version, so a retrained model reclassifies them
+    timings.update(classifier.load())
+    print(f"✓ Model loaded successfully! (version {classifier.MODEL_VERSION})")
+    # Keywords skip the stop words, so the lexicon learns once they are loaded
+    start = time.perf_counter()
+    learned = domain_lexicon.learn_all(description_cache.entries())
+    timings["lexiconMs"] = round((time.perf_counter() - start) * 1000, 1)
+    print(f"✓ Domain lexicon learned from {learned} cached descriptions")
+    return timings
+
+warmup = Warmup(initialize)
+
+def fallback_description(url: str, title: str = "") -> str:
+    """Description used when Gemini is unavailable: the title if there is one, else the domain"""
     try:
         domain = urlparse(url).netloc.replace('www.', '')
     except:
         domain = url
-    
+    if title and title.strip():
+        return title
+    return f"Website: {domain}"
+
+def generate_description(url: str, title: str = "") -> str:
+    """Ask Gemini for a description. Raises on API errors, including 429s."""
+    prompt = f"Give a 4-5 sentence description using keywords of what this website is doing or telling us based on its URL and title and its contents. URL: {url}, Title: {title if title else 'Unknown'}. Only return the description, nothing else."
+    response = model_gemini.generate_content(prompt)
+    description = response.text.strip()
+    # Only real Gemini output is cached; fallbacks would hide the page once the quota recovers
+    description_cache.put(url, title, description)
+    domain_lexicon.learn(url, description)
+    return description
+
+# Concurrent Gemini fetching under a token bucket, retrying 429s with jittered backoff
+description_fetcher = desc_fetcher.from_env(generate_description, fallback_description)
+gemini_provider = GeminiProvider(description_fetcher)
+
+def get_website_description(url: str, title: str = "") -> str:
     # If no Gemini API key, use fallback immediately
     if not GEMINI_API_KEY:
-        return f"{title if title else domain}" if title else f"Website: {domain}"
-    
-    try:
-        prompt = f"Give a 4-5 sentence description using keywords of what this website is doing or telling us based on its URL and title and its contents. URL: {url}, Title: {title if title else 'Unknown'}. Only return the description, nothing else."
-        response = model_gemini.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        error_msg = str(e)
-        
-        # Handle rate limiting - use fallback description
-        if "429" in error_msg or "quota" in error_msg.lower() or "rate" in error_msg.lower():
-            print(f"⚠️ Rate limit reached for {url}. Using fallback description.")
-            # Use title as description if available, otherwise use domain
-            if title and title.strip():
-                return title
-            else:
-                return f"Website: {domain}"
-        
-        # Other errors - log and use fallback
-        print(f"Error getting description for {url}: {e}")
-        if title and title.strip():
-            return title
-        else:
-            return f"Website: {domain}"
+        return fallback_description(url, title)
+    description, _ = description_fetcher.fetch_one(url, title)
+    return description
 
 def classify_website(text: str) -> tuple:
     """Classify website based on text description using trained model"""
-    preprocessed_text = preprocessing(text)
-    vectorized_text = vectorizer.transform([preprocessed_text])
-    category = model.predict(vectorized_text)[0]
-    
-    # Get confidence from decision function
-    decision_scores = model.decision_function(vectorized_text)[0]
-    if len(decision_scores.shape) > 0 and len(decision_scores) > 1:
-        max_score = max(decision_scores)
-        min_score = min(decision_scores)
-        if max_score != min_score:
-            confidence = ((max_score - min_score) / (max_score - min_score + 1)) * 100
-        else:
-            confidence = 95.0
-    else:
-        confidence = min(abs(decision_scores) * 10, 99.9)
-    
-    return category, confidence
+    return classify_batch([text])[0]
+
+def activity_key(activity):
+    """Dedup key for an activity: visits to the same page with the same title share one analysis"""
+    return (desc_cache.normalize_url(activity.get("url", "")), (activity.get("title") or "").strip())
+
+def plan_activities(activities):
+    """Group activities by activity_key, preserving first-seen order"""
+    groups = {}
+    for activity in activities:
+        groups.setdefault(activity_key(activity), []).append(activity)
+    return groups
+
+def utc_now():
+    """Current time as naive UTC, comparable with the dates Mongo stores"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 # Helper to convert ObjectId to string
 def serialize_document(doc):
     doc["_id"] = str(doc["_id"])
     return doc
 
+def build_time_query(hours):
+    """Mongo filter for activities from the past `hours` hours (all activities if None)"""
+    if hours is not None and hours > 0:
+        time_limit = utc_now() - timedelta(hours=hours)
+        print(f"Filtering activities from past {hours} hours (since {time_limit})")
+        return {"startTime": {"$gte": time_limit}}
+    return {}
+
+def analyze_pages(groups, loaded):
+    """Describe and classify each unique page of a plan_activities() grouping with the `loaded` model
+    
+    Returns:
+        tuple: ({key: (description, category, confidence, alternatives)}, counts to add to the run stats:
+            pages resolved by the domain index, descriptions requested from Gemini,
+            fallbacks used and descriptions built locally)
+    """
+    analysis = {}
+    if DOMAIN_INDEX_ENABLED:
+        # Known domains skip descriptions and the model entirely
+        for key, group in groups.items():
+            url = group[0].get("url", "")
+            resolved = domain_index.lookup(url, loaded.version)
+            if resolved is not None:
+                analysis[key] = (fallback_description(url, group[0].get("title", "")), *resolved, [])
+        CACHE_LOOKUPS.inc(len(analysis), cache="domain_index", result="hit")
+        CACHE_LOOKUPS.inc(len(groups) - len(analysis), cache="domain_index", result="miss")
+    indexed = len(analysis)
+    groups = {key: group for key, group in groups.items() if key not in analysis}
+    
+    descriptions = {}
+    pending = []
+    for key, group in groups.items():
+        url = group[0].get("url", "")
+        title = group[0].get("title", "")
+        
+        # Get description from the cache; only misses go to a provider
+        description = description_cache.get(url, title)
+        CACHE_LOOKUPS.inc(cache="description", result="miss" if description is None else "hit")
+        if description is not None:
+            descriptions[key] = description
+        else:
+            pending.append(key)
+    DESCRIPTIONS.inc(len(groups) - len(pending), source="cache")
+    
+    def page(key):
+        return groups[key][0].get("url", ""), groups[key][0].get("title", "")
+    
+    # Without Gemini, local descriptions are kept whatever the classifier makes of them
+    local_only = DESCRIPTION_PROVIDER == "local" or (DESCRIPTION_PROVIDER == "tiered" and not GEMINI_API_KEY)
+    if local_only:
+        candidates = pending
+    elif DESCRIPTION_PROVIDER == "tiered":
+        candidates = [key for key in pending if domain_lexicon.knows(page(key)[0])]
+    else:
+        candidates = []
+    local = 0
+    if candidates:
+        with STAGE_SECONDS.time(stage="description_local"):
+            built = local_provider.describe_many([page(key) for key in candidates])
+        # Scored now so low-confidence pages can still go to Gemini; the prediction cache
+        # makes the final classification of the accepted ones free
+        checks = classify_batch([f"{page(key)[1]} {text}" for key, (text, _) in zip(candidates, built)], loaded)
+        for key, (text, _), (_, confidence, _) in zip(candidates, built, checks):
+            if local_only or confidence >= DESCRIPTION_LOCAL_MIN_CONFIDENCE:
+                descriptions[key] = text
+                local += 1
+        DESCRIPTIONS.inc(local, source="local")
+    
+    remote = [key for key in pending if key not in descriptions]
+    fallbacks = 0
+    if remote and not GEMINI_API_KEY:
+        for key in remote:
+            descriptions[key] = fallback_description(*page(key))
+        DESCRIPTIONS.inc(len(remote), source="fallback")
+        remote = []
+    elif remote:
+        print(f"Fetching {len(remote)} descriptions from Gemini ({description_fetcher.concurrency} concurrent)...")
+        with STAGE_SECONDS.time(stage="description_fetch"):
+            fetched = gemini_provider.describe_many([page(key) for key in remote])
+        for key, (description, ok) in zip(remote, fetched):
+            descriptions[key] = description
+            fallbacks += not ok
+        DESCRIPTIONS.inc(len(remote) - fallbacks, source="gemini")
+        DESCRIPTIONS.inc(fallbacks, source="fallback")
+    
+    # Classify every unique page (title + description) in one vectorized batch
+    texts = [f"{group[0].get('title', '')} {descriptions[key]}" for key, group in groups.items()]
+    predictions = classify_batch(texts, loaded)
+    
+    # Checked once: formatting every page is measurable on large runs even when nothing is emitted
+    verbose = logger.isEnabledFor(logging.DEBUG)
+    for idx, ((key, group), (category, confidence, alternatives)) in enumerate(zip(groups.items(), predictions), 1):
+        analysis[key] = (descriptions[key], category, confidence, alternatives)
+        
+        if verbose:
+            total_duration = sum(activity.get("duration", 0) or 0 for activity in group)
+            logger.debug(
+                "[%d] %s | %s | visits=%d duration=%ss (%.2f min) | %s | category=%s confidence=%.2f%%",
+                idx, group[0].get('url', ''), group[0].get('title', ''),
+                sum(activity.get("sessionRecords", 1) for activity in group),
+                total_duration, total_duration / 60, descriptions[key], category, confidence
+            )
+    
+    if DOMAIN_INDEX_ENABLED and groups:
+        domain_index.learn(
+            [(group[0].get("url", ""), category, confidence) for group, (category, confidence, _) in zip(groups.values(), predictions)],
+            loaded.version
+        )
+    
+    return analysis, {"indexed": indexed, "requested": len(remote), "fallbacks": fallbacks, "local": local}
+
+def build_result(activity, page_analysis, model_version=None):
+    """API representation of one activity together with its page's analysis"""
+    description, category, confidence, alternatives = page_analysis
+    return {
+        "_id": str(activity["_id"]),
+        "url": activity.get("url", ""),
+        "title": activity.get("title", ""),
+        "startTime": str(activity.get("startTime", "")),
+        "endTime": str(activity.get("endTime", "")),
+        "duration": activity.get("duration", 0),
+        "description": description,
+        "category": category,
+        "confidence": round(confidence, 2),
+        "alternatives": alternatives,
+        "modelVersion": model_version or classifier.MODEL_VERSION
+    }
+
+def stored_analysis(activity):
+    """(description, category, confidence, alternatives) persisted on the activity by an earlier run, or None"""
+    if "category" not in activity:
+        return None
+    return (activity.get("description", ""), activity["category"], activity.get("confidence", 0.0),
+            activity.get("alternatives", []))
+
+async def persist_analysis(activities, known, model_version):
+    """Write each activity's page analysis and the model version that produced it back to Mongo"""
+    if not activities:
+        return
+    analyzed_at = datetime.now()
+    operations = []
+    for activity in activities:
+        description, category, confidence, alternatives = known[activity_key(activity)]
+        operations.append(UpdateOne({"_id": activity["_id"]}, {
+            "$set": {
+                "description": description,
+                "category": category,
+                "confidence": confidence,
+                "alternatives": alternatives,
+                "modelVersion": model_version,
+                "analyzedAt": analyzed_at
+            },
+            # Server time of this very write; the columnar export's watermark
+            "$currentDate": {"updatedAt": True}
+        }))
+    with STAGE_SECONDS.time(stage="persist"):
+        await collection.bulk_write(operations, ordered=False)
+
+def new_run_stats(backfill_limit):
+    return {"analyzed": 0, "reused": 0, "unique": 0, "indexed": 0, "requested": 0, "fallbacks": 0, "local": 0,
+            "backfillLeft": backfill_limit}
+
+async def process_activities(activities, known, run):
+    """Analyze the activities that have no result for the current model version
+    
+    Results from the current model are reused as stored. Results from an older
+    model are redone while run["backfillLeft"] lasts and returned as stored after
+    that. Page analyses are looked up in, and added to, `known`.
+    
+    Returns:
+        list: one result dict per activity, in order
+    """
+    if not warmup.ready:
+        await warmup.wait()
+    # One model for the whole call, even if a new version is swapped in meanwhile
+    loaded = classifier.current_model()
+    if run.setdefault("modelVersion", loaded.version) != loaded.version:
+        # Swapped between chunks of a run: analyses memoized under the old model are not reused
+        known.clear()
+        run["modelVersion"] = loaded.version
+    todo = []
+    for activity in activities:
+        stored = stored_analysis(activity)
+        if stored is not None and activity.get("modelVersion") == loaded.version:
+            known.setdefault(activity_key(activity), stored)
+        elif stored is not None and run["backfillLeft"] <= 0:
+            continue
+        else:
+            if stored is not None:
+                run["backfillLeft"] -= 1
+            todo.append(activity)
+    
+    # Group repeat visits so each unique page is described and classified once
+    groups = plan_activities(todo)
+    new_groups = {key: group for key, group in groups.items() if key not in known}
+    # Gemini calls and scoring are blocking; keep them off the event loop
+    analysis, counts = await run_in_threadpool(analyze_pages, new_groups, loaded)
+    known.update(analysis)
+    await persist_analysis(todo, known, loaded.version)
+    
+    run["analyzed"] += len(todo)
+    run["reused"] += len(activities) - len(todo)
+    ACTIVITIES_ANALYZED.inc(len(todo), result="analyzed")
+    ACTIVITIES_ANALYZED.inc(len(activities) - len(todo), result="reused")
+    run["unique"] += len(new_groups)
+    for name, count in counts.items():
+        run[name] += count
+    
+    # Fan the per-page analysis back out to every activity, keeping the original order
+    todo_ids = {id(activity) for activity in todo}
+    results = []
+    with STAGE_SECONDS.time(stage="serialize"):
+        for activity in activities:
+            if id(activity) in todo_ids:
+                results.append(build_result(activity, known[activity_key(activity)], loaded.version))
+            else:
+                results.append(build_result(activity, stored_analysis(activity), activity.get("modelVersion")))
+    return results
+
+def run_summary(run):
+    return {
+        "analyzed": run["analyzed"],
+        "reused": run["reused"],
+        "unique": run["unique"],
+        "dedupRatio": round(run["analyzed"] / run["unique"], 2) if run["unique"] else 0.0,
+        "modelVersion": run.get("modelVersion") or classifier.MODEL_VERSION,
+        "descriptionCache": description_cache.stats(),
+        "predictionCache": prediction_cache.stats(),
+        "descriptionFetch": {"requested": run["requested"], "fallbacks": run["fallbacks"], "local": run["local"]},
+        "domainLexicon": domain_lexicon.stats(),
+        "domainIndex": {"resolved": run["indexed"], **domain_index.stats()}
+    }
+
+@app.on_event("startup")
+async def start_warmup():
+    """Load the model and clients in the background; /readyz reports when they are done"""
+    warmup.start()
+
+@app.on_event("startup")
+async def ensure_indexes():
+    """Index backing /data cursors and time-range filters (and the /analyze hours filter)"""
+    try:
+        await collection.create_index([("startTime", 1), ("_id", 1)])
+        # Watermarks of the incremental columnar export
+        await collection.create_index([("updatedAt", 1), ("_id", 1)])
+        if TOMBSTONE_TTL_DAYS > 0:
+            await db[TOMBSTONE_COLLECTION].create_index("deletedAt", expireAfterSeconds=int(TOMBSTONE_TTL_DAYS * 86400))
+        else:
+            await db[TOMBSTONE_COLLECTION].create_index("deletedAt")
+        await job_manager.coll.create_index([("status", 1)])
+    except Exception as e:
+        print(f"⚠️ Could not create activity indexes: {e}")
+
+@app.on_event("startup")
+async def resume_analysis_jobs():
+    """Pick up jobs left queued, or abandoned mid-run, by a previous server"""
+    try:
+        resumed = await job_manager.resume()
+        if resumed:
+            print(f"Resuming {resumed} analysis job(s)")
+    except Exception as e:
+        print(f"⚠️ Could not resume analysis jobs: {e}")
+
+@app.on_event("shutdown")
+async def stop_analysis_jobs():
+    await job_manager.shutdown()
+
+async def compaction_loop():
+    """Compact the recent activities every COMPACTION_INTERVAL_MINUTES"""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_MINUTES * 60)
+        try:
+            start = utc_now() - timedelta(hours=COMPACTION_LOOKBACK_HOURS)
+            stats = await run_compaction(build_data_query(start), COMPACTION_GAP_SECONDS, COMPACTION_KEEP_RAW)
+            if stats["merged"]:
+                print(f"Compacted {stats['merged']} activities into {stats['sessions']} sessions")
+        except CompactionRunning:
+            # Another worker's loop or a POST /compact is on it
+            pass
+        except Exception as e:
+            print(f"⚠️ Compaction failed: {e}")
+
+compaction_task = None
+
+@app.on_event("startup")
+async def start_compaction():
+    global compaction_task
+    if COMPACTION_INTERVAL_MINUTES > 0:
+        compaction_task = asyncio.create_task(compaction_loop())
+
+@app.on_event("shutdown")
+async def stop_compaction():
+    if compaction_task is not None:
+        compaction_task.cancel()
+
+# /model endpoints and the hot-reload watch
+app.include_router(model_api.router)
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503 until the model, stop words and Gemini client are loaded"""
+    status = {**warmup.status(), "modelVersion": classifier.MODEL_VERSION}
+    return JSONResponse(status, status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Stage timings and cache/Gemini counters in the Prometheus text format"""
+    return metrics.render()
+
 @app.get("/")
 def read_root():
     return {"message": "Website Classification API - MongoDB + FastAPI + Gemini"}
 
 # Endpoint to analyze all websites
 @app.get("/analyze")
-def analyze_websites(hours: int = None):
+async def analyze_websites(hours: int = None, backfill: int = ANALYZE_BACKFILL_LIMIT):
     """Fetch all activities from MongoDB, get descriptions, classify them, and return results
     
+    Activities already classified by the current model are returned as stored;
+    only new ones (plus up to `backfill` from an older model) are analyzed.
+    
     Args:
         hours (int, optional): Filter activities from past X hours. If None, analyze all activities.
+        backfill (int): Most activities with an older model's result to reclassify in this run.
     """
     try:
-        # Build query with time filter if hours specified
-        query = {}
-        if hours is not None and hours > 0:
-            time_limit = datetime.now() - timedelta(hours=hours)
-            query = {"startTime": {"$gte": time_limit}}
-            print(f"Filtering activities from past {hours} hours (since {time_limit})")
-        
-        activities = list(collection.find(query))
-        results = []
+        query = build_time_query(hours)
+        activities = await find_all(collection, query)
         
         print("=" * 80)
         print("WEBSITE CLASSIFICATION ANALYSIS")
@@ -155,107 +540,518 @@ def analyze_websites(hours: int = None):
             print(f"Time Range: Past {hours} hours")
         print(f"Total activities found: {len(activities)}\n")
         
-        # Track if we hit rate limit
-        rate_limit_hit = False
+        run = new_run_stats(backfill)
+        results = await process_activities(activities, {}, run)
+        summary = run_summary(run)
         
-        for idx, activity in enumerate(activities, 1):
-            url = activity.get("url", "")
-            title = activity.get("title", "")
-            start_time = activity.get("startTime", "")
-            end_time = activity.get("endTime", "")
-            duration = activity.get("duration", 0)
-            
-            # Get description using Gemini (with fallback handling)
-            description = get_website_description(url, title)
-            
-            # If we're using fallback due to rate limit, note it
-            if "Website:" in description or description == title:
-                if not rate_limit_hit and GEMINI_API_KEY:
-                    print(f"\n⚠️ Using fallback descriptions (Gemini API limit may be reached)")
-                    rate_limit_hit = True
-            
-            # Classify based on title + description
-            text_to_classify = f"{title} {description}"
-            category, confidence = classify_website(text_to_classify)
-            
-            result = {
-                "_id": str(activity["_id"]),
-                "url": url,
-                "title": title,
-                "startTime": str(start_time),
-                "endTime": str(end_time),
-                "duration": duration,
-                "description": description,
-                "category": category,
-                "confidence": round(confidence, 2)
-            }
-            results.append(result)
-            
-            # Print analysis
-            print(f"\n[{idx}] Activity Analysis:")
-            print(f"  URL: {url}")
-            print(f"  Title: {title}")
-            print(f"  Start Time: {start_time}")
-            print(f"  End Time: {end_time}")
-            print(f"  Duration: {duration} seconds ({duration/60:.2f} minutes)")
-            print(f"  Description: {description}")
-            print(f"  ✓ Category: {category}")
-            print(f"  ✓ Confidence: {confidence:.2f}%")
-            print("-" * 80)
-            
-            # Small delay between requests to avoid hitting rate limits too fast
-            if GEMINI_API_KEY and not rate_limit_hit and idx < len(activities):
-                time.sleep(0.5)  # 0.5 second delay between API calls
-        
-        print(f"\nTotal activities analyzed: {len(results)}")
-        if rate_limit_hit:
-            print("ℹ️  Note: Some descriptions used fallback due to API limits")
+        print(f"\nTotal activities: {len(results)} ({run['reused']} already analyzed, {run['analyzed']} analyzed now)")
+        print(f"Unique pages analyzed: {run['unique']} ({summary['dedupRatio']}x dedup)")
+        print(f"Description cache: {summary['descriptionCache']['hits']} hits, {summary['descriptionCache']['misses']} misses")
+        print(f"Prediction cache: {summary['predictionCache']['hits']} hits, {summary['predictionCache']['misses']} misses")
+        if run["fallbacks"]:
+            print(f"ℹ️  Note: {run['fallbacks']} descriptions used fallback due to API errors or limits")
         print("=" * 80)
         
         return {
             "total": len(results),
             "hours": hours,
+            **summary,
             "results": results
         }
     except Exception as e:
         print(f"Error analyzing activities: {e}")
         return {"error": str(e)}
 
-@app.get("/data", response_model=List[dict])
-def get_all_data():
-    """Get all activities from MongoDB and print them"""
-    data = list(collection.find())
+def trim_memo(memo, activities):
+    """Mark the activities' pages as recently used and bound the memo to STREAM_MEMO_ENTRIES"""
+    for activity in activities:
+        key = activity_key(activity)
+        if key in memo:
+            memo.move_to_end(key)
+    while len(memo) > STREAM_MEMO_ENTRIES:
+        memo.popitem(last=False)
+
+async def stream_analysis(start, chunk_size, backfill):
+    """Yield NDJSON lines: one classified activity per line, then a summary line with "done": true
+    
+    Each chunk is a fresh (startTime, _id) range query after the previous
+    one, like a background job's, so no cursor sits idle on the server
+    while a chunk waits for Gemini.
+    """
+    # Chunks start at one activity and double up to chunk_size, so the first
+    # result goes out as soon as a single page is classified
+    memo = OrderedDict()
+    run = new_run_stats(backfill)
+    total = 0
+    size = 1
+    after = None
+    sort = [("startTime", 1), ("_id", 1)]
     
-    print("\n" + "=" * 80)
-    print("📊 FETCHED ACTIVITIES FROM DATABASE")
-    print("=" * 80)
-    print(f"Total activities: {len(data)}\n")
+    try:
+        while True:
+            chunk = await find_all(collection, build_data_query(start, after=after), sort=sort, limit=size)
+            if not chunk:
+                break
+            results = await process_activities(chunk, memo, run)
+            with STAGE_SECONDS.time(stage="serialize"):
+                lines = [json.dumps(result) + "\n" for result in results]
+            # Bound the cross-chunk memo so memory stays flat on long histories
+            trim_memo(memo, chunk)
+            for line in lines:
+                total += 1
+                yield line
+            after = encode_cursor(chunk[-1])
+            size = min(size * 2, chunk_size)
+        
+        yield json.dumps({"done": True, "total": total, **run_summary(run)}) + "\n"
+    except Exception as e:
+        print(f"Error streaming analysis: {e}")
+        yield json.dumps({"done": True, "error": str(e), "total": total}) + "\n"
+
+@app.get("/analyze/stream")
+async def analyze_websites_stream(hours: int = None, chunk_size: int = 100, backfill: int = ANALYZE_BACKFILL_LIMIT):
+    """Same analysis as /analyze, streamed as NDJSON while the Mongo cursor is read
     
-    for idx, doc in enumerate(data, 1):
-        print(f"[{idx}] Activity:")
-        print(f"  ID: {doc.get('_id')}")
-        print(f"  URL: {doc.get('url', 'N/A')}")
-        print(f"  Title: {doc.get('title', 'N/A')}")
-        print(f"  Start Time: {doc.get('startTime', 'N/A')}")
-        print(f"  End Time: {doc.get('endTime', 'N/A')}")
-        print(f"  Duration: {doc.get('duration', 0)} seconds")
-        print("-" * 80)
+    Args:
+        hours (int, optional): Filter activities from past X hours. If None, analyze all activities.
+        chunk_size (int): Largest number of activities described and classified together.
+        backfill (int): Most activities with an older model's result to reclassify in this run.
+    """
+    chunk_size = max(1, min(chunk_size, 1000))
+    start = utc_now() - timedelta(hours=hours) if hours is not None and hours > 0 else None
+    return StreamingResponse(
+        stream_analysis(start, chunk_size, backfill),
+        media_type="application/x-ndjson"
+    )
+
+def build_data_query(start=None, end=None, after=None, until=None):
+    """Mongo filter for /data: optional startTime range plus the position after a page cursor
     
-    return [serialize_document(d) for d in data]
+    `until` is a cursor too; when given, only activities up to and including it match.
+    """
+    query = {}
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if time_range:
+        query["startTime"] = time_range
+    if until:
+        start_time, last_id = decode_cursor(until)
+        if start_time is None:
+            bound = {"startTime": None, "_id": {"$lte": last_id}}
+        else:
+            bound = {"$or": [
+                {"startTime": None},
+                {"startTime": {"$lt": start_time}},
+                {"startTime": start_time, "_id": {"$lte": last_id}}
+            ]}
+        query = {"$and": [query, bound]} if query else bound
+    if after:
+        start_time, last_id = decode_cursor(after)
+        if start_time is None:
+            # Activities without a startTime sort first; after them come all dated ones
+            position = {"$or": [
+                {"startTime": None, "_id": {"$gt": last_id}},
+                {"startTime": {"$type": "date"}}
+            ]}
+        else:
+            position = {"$or": [
+                {"startTime": {"$gt": start_time}},
+                {"startTime": start_time, "_id": {"$gt": last_id}}
+            ]}
+        query = {"$and": [query, position]} if query else position
+    return query
+
+def build_projection(fields):
+    """Projection for a comma-separated field list; _id and startTime are always kept for cursors"""
+    if not fields:
+        return None
+    projection = {field.strip(): 1 for field in fields.split(",") if field.strip()}
+    projection["startTime"] = 1
+    return projection
+
+def encode_cursor(doc):
+    start_time = doc.get("startTime")
+    return f"{start_time.isoformat() if isinstance(start_time, datetime) else ''}_{doc['_id']}"
+
+def decode_cursor(cursor):
+    start_time, _, last_id = cursor.rpartition("_")
+    if not ObjectId.is_valid(last_id):
+        raise ValueError("bad activity id")
+    return (datetime.fromisoformat(start_time) if start_time else None), ObjectId(last_id)
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+@app.get("/data")
+async def get_all_data(limit: int = DATA_PAGE_SIZE, after: str = None, start: datetime = None, end: datetime = None,
+                 fields: str = None, stream: bool = False):
+    """Page through activities in (startTime, _id) order
+    
+    Args:
+        limit (int): Page size, capped at DATA_PAGE_MAX.
+        after (str, optional): nextCursor from the previous page.
+        start / end (datetime, optional): Only activities with start <= startTime < end.
+        fields (str, optional): Comma-separated fields to return, e.g. "url,title,duration".
+        stream (bool): Export every matching activity as NDJSON instead of one page.
+    """
+    try:
+        query = build_data_query(start, end, after)
+    except ValueError as e:
+        return {"error": f"Invalid cursor: {e}"}
+    projection = build_projection(fields)
+    sort = [("startTime", 1), ("_id", 1)]
+    
+    if stream:
+        async def export():
+            async for batch in find_batches(collection, query, projection, sort, batch_size=DATA_PAGE_MAX):
+                yield "".join(json.dumps(serialize_document(doc), default=json_default) + "\n" for doc in batch)
+        return StreamingResponse(export(), media_type="application/x-ndjson")
+    
+    limit = max(1, min(limit, DATA_PAGE_MAX))
+    # One extra document tells us whether there is a next page
+    data = await find_all(collection, query, projection, sort, limit=limit + 1)
+    has_more = len(data) > limit
+    data = data[:limit]
+    next_cursor = encode_cursor(data[-1]) if has_more else None
+    print(f"📊 /data: returned {len(data)} activities (more: {has_more})")
+    
+    return {
+        "items": [serialize_document(d) for d in data],
+        "count": len(data),
+        "nextCursor": next_cursor
+    }
 
 @app.get("/data/{item_id}")
-def get_item(item_id: str):
-    document = collection.find_one({"_id": ObjectId(item_id)})
+async def get_item(item_id: str, fields: str = None):
+    if not ObjectId.is_valid(item_id):
+        return {"error": "Invalid item id"}
+    document = await collection.find_one({"_id": ObjectId(item_id)}, build_projection(fields))
     if document:
         return serialize_document(document)
     return {"error": "Item not found"}
 
+async def run_analysis_job(job, checkpoint):
+    """Analyze a job's time range in chunks, checkpointing the cursor and run stats after each
+    
+    Every chunk is a fresh range query from the last checkpoint, so a resumed
+    job continues where it stopped and no cursor is held open across Gemini calls.
+    """
+    params = job["params"]
+    state = job.get("checkpoint") or {}
+    run = state.get("run") or new_run_stats(params["backfill"])
+    after = state.get("cursor")
+    processed = job.get("processed", 0)
+    if job.get("total") is None:
+        total = await collection.count_documents(build_data_query(params["start"], params["end"]))
+        await checkpoint(total=total)
+    
+    memo = OrderedDict()
+    sort = [("startTime", 1), ("_id", 1)]
+    while True:
+        chunk = await find_all(collection, build_data_query(params["start"], params["end"], after), sort=sort,
+                               limit=params["chunkSize"])
+        if not chunk:
+            return
+        await process_activities(chunk, memo, run)
+        trim_memo(memo, chunk)
+        processed += len(chunk)
+        after = encode_cursor(chunk[-1])
+        await checkpoint(processed=processed, checkpoint={"cursor": after, "run": run})
+
+job_manager = JobManager(db["analysis_jobs"], run_analysis_job, ANALYSIS_JOB_WORKERS, ANALYSIS_JOB_LEASE_SECONDS)
+
+def serialize_job(job):
+    """API representation of an analysis job"""
+    run = (job.get("checkpoint") or {}).get("run") or {}
+    total = job.get("total")
+    if total:
+        progress = round(100 * job.get("processed", 0) / total, 1)
+    else:
+        progress = 100.0 if job["status"] == "completed" else 0.0
+    return {
+        "id": str(job["_id"]),
+        "status": job["status"],
+        "params": job["params"],
+        "processed": job.get("processed", 0),
+        "total": total,
+        "progress": progress,
+        "analyzed": run.get("analyzed", 0),
+        "reused": run.get("reused", 0),
+        "unique": run.get("unique", 0),
+        "fallbacks": run.get("fallbacks", 0),
+        "cancelRequested": job.get("cancelRequested", False),
+        "error": job.get("error"),
+        "createdAt": job.get("createdAt"),
+        "startedAt": job.get("startedAt"),
+        "finishedAt": job.get("finishedAt")
+    }
+
+@app.post("/jobs/analyze")
+async def submit_analysis_job(hours: int = None, start: datetime = None, end: datetime = None,
+                              backfill: int = ANALYZE_BACKFILL_LIMIT, chunk_size: int = 100):
+    """Queue an analysis run in the background; poll /jobs/{id} for progress
+    
+    Args:
+        hours (int, optional): Analyze activities from the past X hours (overrides start).
+        start / end (datetime, optional): Only activities with start <= startTime < end.
+        backfill (int): Most activities with an older model's result to reclassify in this run.
+        chunk_size (int): Activities analyzed between checkpoints.
+    """
+    # Fix the range now, so a resumed job covers the same activities
+    now = utc_now()
+    if hours is not None and hours > 0:
+        start = now - timedelta(hours=hours)
+    job = await job_manager.submit({
+        "start": as_utc(start) if start is not None else None,
+        "end": as_utc(end) if end is not None else now,
+        "backfill": backfill,
+        "chunkSize": max(1, min(chunk_size, 1000))
+    })
+    return serialize_job(job)
+
+@app.get("/jobs")
+async def list_analysis_jobs(limit: int = 20):
+    return {"jobs": [serialize_job(job) for job in await job_manager.recent(max(1, min(limit, 100)))]}
+
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        return {"error": "Invalid job id"}
+    job = await job_manager.get(job_id)
+    if job is None:
+        return {"error": "Job not found"}
+    return serialize_job(job)
+
+@app.get("/jobs/{job_id}/results")
+async def get_analysis_job_results(job_id: str, limit: int = DATA_PAGE_SIZE, after: str = None):
+    """Page through the results a job has checkpointed so far, in (startTime, _id) order"""
+    if not ObjectId.is_valid(job_id):
+        return {"error": "Invalid job id"}
+    job = await job_manager.get(job_id)
+    if job is None:
+        return {"error": "Job not found"}
+    done = (job.get("checkpoint") or {}).get("cursor")
+    if not done:
+        return {"status": job["status"], "items": [], "count": 0, "nextCursor": None}
+    params = job["params"]
+    try:
+        query = build_data_query(params["start"], params["end"], after, until=done)
+    except ValueError as e:
+        return {"error": f"Invalid cursor: {e}"}
+    
+    limit = max(1, min(limit, DATA_PAGE_MAX))
+    activities = await find_all(collection, query, sort=[("startTime", 1), ("_id", 1)], limit=limit + 1)
+    has_more = len(activities) > limit
+    activities = activities[:limit]
+    items = [
+        build_result(activity, stored_analysis(activity), activity.get("modelVersion"))
+        for activity in activities if stored_analysis(activity) is not None
+    ]
+    return {
+        "status": job["status"],
+        "items": items,
+        "count": len(items),
+        "nextCursor": encode_cursor(activities[-1]) if has_more else None
+    }
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_analysis_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        return {"error": "Invalid job id"}
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        return {"error": "Job not found"}
+    return serialize_job(job)
+
+async def run_compaction(query, gap_seconds, keep_raw):
+    raw_coll = db[COMPACTION_RAW_COLLECTION] if keep_raw else None
+    # The lease keeps this from overlapping the loop in another worker or a concurrent POST /compact
+    return await compact(collection, query, gap_seconds, raw_coll, tombstone_coll=db[TOMBSTONE_COLLECTION],
+                         lock_coll=db[LOCK_COLLECTION])
+
+@app.post("/compact")
+async def compact_activities(hours: int = None, start: datetime = None, end: datetime = None,
+                             gap: float = COMPACTION_GAP_SECONDS, keep_raw: bool = COMPACTION_KEEP_RAW):
+    """Merge consecutive or overlapping activities of the same URL into sessions
+    
+    Args:
+        hours (int, optional): Compact activities from the past X hours (overrides start).
+        start / end (datetime, optional): Only activities with start <= startTime < end.
+        gap (float): Largest pause, in seconds, between two activities of one session.
+        keep_raw (bool): Copy the merged raw records to the raw collection before deleting them.
+    """
+    try:
+        if hours is not None and hours > 0:
+            start = utc_now() - timedelta(hours=hours)
+        began = time.perf_counter()
+        stats = await run_compaction(build_data_query(start, end), max(0.0, gap), keep_raw)
+        return {
+            **stats,
+            "gapSeconds": gap,
+            "rawCollection": COMPACTION_RAW_COLLECTION if keep_raw else None,
+            "seconds": round(time.perf_counter() - began, 3)
+        }
+    except CompactionRunning as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    except Exception as e:
+        print(f"Error compacting activities: {e}")
+        return {"error": str(e)}
+
+# Exports from this process wait their turn; one from another process is refused by the directory's flock
+export_lock = asyncio.Lock()
+
+@app.post("/export")
+async def export_columnar(format: str = columnar_export.EXPORT_FORMAT, rebuild: bool = False):
+    """Append activities changed since the last export to day-partitioned Parquet or Arrow files
+    
+    Args:
+        format (str): "parquet" or "arrow"; must match an existing export unless rebuilding.
+        rebuild (bool): Delete the existing export and write everything again.
+    """
+    try:
+        async with export_lock:
+            began = time.perf_counter()
+            summary = await columnar_export.export_activities(collection, fmt=format.lower(), rebuild=rebuild,
+                                                              tombstone_coll=db[TOMBSTONE_COLLECTION])
+            return {**summary, "seconds": round(time.perf_counter() - began, 3)}
+    except columnar_export.ExportRunning as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    except Exception as e:
+        print(f"Error exporting activities: {e}")
+        return {"error": str(e)}
+
+class ActivityIn(BaseModel):
+    url: str
+    title: str = ""
+    startTime: datetime
+    endTime: datetime
+    duration: Optional[float] = None  # seconds; endTime - startTime when omitted
+
+class ActivityBatch(BaseModel):
+    activities: List[ActivityIn]
+
+def as_utc(value: datetime) -> datetime:
+    """Naive UTC datetime, the way pymongo stores and returns dates
+
+    Aware values are converted to UTC; naive values are already taken as UTC.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+ingest_buffer = WriteBehindBuffer(collection, INGEST_QUEUE_MAX, INGEST_FLUSH_SIZE, INGEST_FLUSH_MS)
+
+@app.on_event("shutdown")
+async def flush_ingest_buffer():
+    await ingest_buffer.close()
+
+@app.post("/ingest", status_code=202)
+async def ingest_activities(batch: ActivityBatch):
+    """Accept a batch of activities for a background bulk write
+    
+    Activities are acknowledged once queued, not once stored. A full queue
+    answers 429 (writes are behind) or 503 (Mongo writes are failing) with
+    Retry-After; the client should resend the same batch later.
+    """
+    if len(batch.activities) > INGEST_BATCH_MAX:
+        return JSONResponse({"error": f"At most {INGEST_BATCH_MAX} activities per request"}, status_code=413)
+    documents = []
+    for activity in batch.activities:
+        # Clients may mix "...Z"/offset and naive timestamps; subtracting those would raise
+        start_time, end_time = as_utc(activity.startTime), as_utc(activity.endTime)
+        documents.append({
+            "url": activity.url,
+            "title": activity.title,
+            "startTime": start_time,
+            "endTime": end_time,
+            "duration": activity.duration if activity.duration is not None
+            else round((end_time - start_time).total_seconds())
+        })
+    if not ingest_buffer.submit(documents):
+        return JSONResponse(
+            {"error": "Ingest queue is full, retry later", **ingest_buffer.stats()},
+            status_code=503 if ingest_buffer.backing_off else 429,
+            headers={"Retry-After": "1"}
+        )
+    return {"accepted": len(documents), "pending": ingest_buffer.pending}
+
+@app.get("/ingest/stats")
+async def ingest_stats():
+    return ingest_buffer.stats()
+
+# $dateToString formats for /rollup bucket sizes
+ROLLUP_FORMATS = {
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",
+    "month": "%Y-%m"
+}
+
+@app.get("/rollup")
+async def rollup(days: int = 30, bucket: str = "day", tz: str = "UTC"):
+    """Minutes and visits per category per time bucket, aggregated inside MongoDB
+    
+    Uses the classifications persisted by /analyze; activities not analyzed yet
+    are counted as "Unclassified". The response size depends on the number of
+    buckets and categories, not on the number of activities.
+    
+    Args:
+        days (int): How far back to aggregate.
+        bucket (str): "hour", "day", "week" or "month".
+        tz (str): Timezone the buckets are cut in, e.g. "Asia/Kolkata".
+    """
+    if bucket not in ROLLUP_FORMATS:
+        return {"error": f"bucket must be one of {', '.join(ROLLUP_FORMATS)}"}
+    try:
+        since = utc_now() - timedelta(days=days)
+        pipeline = [
+            {"$match": {"startTime": {"$gte": since}}},
+            {"$group": {
+                "_id": {
+                    "bucket": {"$dateToString": {"format": ROLLUP_FORMATS[bucket], "date": "$startTime", "timezone": tz}},
+                    "category": {"$ifNull": ["$category", "Unclassified"]}
+                },
+                "seconds": {"$sum": {"$ifNull": ["$duration", 0]}},
+                "visits": {"$sum": 1}
+            }},
+            {"$sort": {"_id.bucket": 1, "_id.category": 1}}
+        ]
+        
+        buckets = []
+        totals = {}
+        async for row in collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=MONGO_QUERY_TIMEOUT_MS):
+            label = row["_id"]["bucket"]
+            category = row["_id"]["category"]
+            minutes = round(row["seconds"] / 60, 2)
+            if not buckets or buckets[-1]["bucket"] != label:
+                buckets.append({"bucket": label, "categories": {}})
+            buckets[-1]["categories"][category] = {"minutes": minutes, "visits": row["visits"]}
+            total = totals.setdefault(category, {"minutes": 0.0, "visits": 0})
+            total["minutes"] = round(total["minutes"] + minutes, 2)
+            total["visits"] += row["visits"]
+        
+        return {
+            "since": since.isoformat(),
+            "bucket": bucket,
+            "timezone": tz,
+            "buckets": buckets,
+            "totals": totals
+        }
+    except Exception as e:
+        print(f"Error building rollup: {e}")
+        return {"error": str(e)}
+
 @app.get("/check_db")
-def check_db():
+async def check_db():
     try:
         # Verify we're connected to the correct database
-        db.list_collection_names()
-        count = collection.count_documents({})
+        await db.list_collection_names()
+        count = await collection.count_documents({}, maxTimeMS=MONGO_QUERY_TIMEOUT_MS)
         
         # Extra verification
         print(f"\n🔍 Database Check:")
@@ -275,7 +1071,7 @@ def check_db():
         return {"status": "Connection failed", "error": str(e)}
 
 @app.get("/check-mongo")
-def check_mongo_connection():
+async def check_mongo_connection():
     """Comprehensive MongoDB connection and data check"""
     try:
         print("\n" + "=" * 80)
@@ -283,7 +1079,7 @@ def check_mongo_connection():
         print("=" * 80)
         
         # Check connection
-        client.admin.command('ping')
+        await client.admin.command('ping')
         print("✓ MongoDB server is responding")
         
         # Get database info
@@ -291,16 +1087,16 @@ def check_mongo_connection():
         print(f"Database Name: {db_name}")
         
         # List collections
-        collections = db.list_collection_names()
+        collections = await db.list_collection_names()
         print(f"Collections: {', '.join(collections)}")
         
         # Check activities collection
         if "activities" in collections:
-            activity_count = collection.count_documents({})
+            activity_count = await collection.count_documents({}, maxTimeMS=MONGO_QUERY_TIMEOUT_MS)
             print(f"Total Activities: {activity_count}")
             
             # Get sample activities
-            sample_activities = list(collection.find().limit(3).sort("startTime", -1))
+            sample_activities = await collection.find().limit(3).sort("startTime", -1).to_list(length=3)
             print("\nSample Activities:")
             for idx, act in enumerate(sample_activities, 1):
                 print(f"  [{idx}] {act.get('title', 'Untitled')} - {act.get('url', 'N/A')}")
@@ -1,49 +1,107 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import pickle
-import re
-from nltk.stem.porter import PorterStemmer
-from nltk.corpus import stopwords
-import nltk
-
-# Download required NLTK data
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
+from typing import List
+import os
+import time
+import classifier
+import model_api
+from classifier import classify_batch, prediction_cache
+from microbatch import MicroBatcher
+from warmup import Warmup
+import metrics
 
 app = FastAPI()
 
-# Load models
-vectorizer = pickle.load(open('vectorizer.pkl', 'rb'))
-model = pickle.load(open('model.pkl', 'rb'))
-encoder = pickle.load(open('encoder.pkl', 'rb'))
+# Largest list accepted by /predict_batch
+PREDICT_BATCH_MAX = int(os.getenv("PREDICT_BATCH_MAX", "10000"))
 
-port_stemmer = PorterStemmer()
-stop_words = set(stopwords.words('english'))
+# Window for grouping concurrent /predict calls into one model call; 0 disables it
+PREDICT_MICROBATCH_MS = float(os.getenv("PREDICT_MICROBATCH_MS", "0"))
+PREDICT_MICROBATCH_MAX = int(os.getenv("PREDICT_MICROBATCH_MAX", "256"))
 
 class TextInput(BaseModel):
     text: str
 
-def preprocessing(text):
-    text = text.lower()
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"[^a-zA-Z]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r'[^\w\s,.!?]', '', text)
-    text = text.split()
-    text = [port_stemmer.stem(word) for word in text if not word in stop_words]
-    return " ".join(text)
+class TextBatchInput(BaseModel):
+    texts: List[str]
+
+def initialize():
+    """Load the model and score one text so the first request does not pay for page faults"""
+    timings = classifier.load()
+    start = time.perf_counter()
+    classifier.model.decision_function(classifier.vectorizer.transform(["warm up"]))
+    timings["firstPredictionMs"] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+warmup = Warmup(initialize)
+
+@app.on_event("startup")
+async def start_warmup():
+    warmup.start()
+
+# /model endpoints and the hot-reload watch
+app.include_router(model_api.router)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until the model is loaded and warm"""
+    status = {**warmup.status(), "modelVersion": classifier.MODEL_VERSION}
+    return JSONResponse(status, status_code=200 if warmup.ready else 503)
+
+micro_batcher = MicroBatcher(classify_batch, PREDICT_MICROBATCH_MS, PREDICT_MICROBATCH_MAX) if PREDICT_MICROBATCH_MS > 0 else None
 
 @app.post("/predict")
 async def predict(input: TextInput):
     try:
-        processed_text = preprocessing(input.text)
-        vectorized = vectorizer.transform([processed_text])
-        prediction = model.predict(vectorized)
-        category = encoder.inverse_transform(prediction)[0]
-        return {"category": category}
+        if not warmup.ready:
+            await warmup.wait()
+        if micro_batcher is not None:
+            category, confidence, alternatives = await micro_batcher.submit(input.text)
+        else:
+            category, confidence, alternatives = classify_batch([input.text])[0]
+        return {"category": category, "confidence": round(confidence, 2), "alternatives": alternatives}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/predict_batch")
+async def predict_batch(input: TextBatchInput):
+    """Classify a list of texts with one vectorized model call"""
+    if len(input.texts) > PREDICT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {PREDICT_BATCH_MAX} texts per request")
+    try:
+        if not warmup.ready:
+            await warmup.wait()
+        predictions = await run_in_threadpool(classify_batch, input.texts)
+        return {
+            "count": len(predictions),
+            "results": [
+                {"category": category, "confidence": round(confidence, 2), "alternatives": alternatives}
+                for category, confidence, alternatives in predictions
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/predict/stats")
+async def predict_stats():
+    """Prediction cache hit rate and how well the micro-batcher is coalescing /predict calls"""
+    stats = {"predictionCache": prediction_cache.stats(), "microBatching": micro_batcher is not None}
+    if micro_batcher is not None:
+        stats.update({"windowMs": PREDICT_MICROBATCH_MS, **micro_batcher.stats()})
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def read_metrics():
+    """Preprocess/vectorize/predict timings and prediction cache counters in the Prometheus text format"""
+    return metrics.render()
+
 @app.get("/")
 async def root():
     return {"message": "Website Classification API"}
@@ -0,0 +1,293 @@
+"""Single-file, memory-mapped model artifact.
+
+Layout: 8-byte magic, little-endian uint64 header length, a JSON header,
+then every array as raw bytes at a 64-byte aligned offset. Loading parses
+the header and maps the file read-only, so the arrays are views straight
+into the OS page cache. Every uvicorn worker shares one physical copy of the
+weights, and cold start costs milliseconds instead of unpickling a
+vocabulary dict.
+
+Convert the current pickles with:
+    python artifact.py
+"""
+import hashlib
+import json
+import os
+import pickle
+import re
+import numpy as np
+import scipy.sparse as sp
+
+MAGIC = b"TEYEMDL1"
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+ARTIFACT_PATH = os.getenv("MODEL_ARTIFACT_PATH", "model_artifact.bin")
+
+# Vectorizer parameters the artifact records and its transform implements
+TFIDF_PARAMS = ("token_pattern", "lowercase", "norm", "sublinear_tf")
+HASHING_PARAMS = ("n_features", "alternate_sign", "norm", "token_pattern", "lowercase", "ngram_range", "binary")
+# Only used while fitting; the fitted vocabulary and idf weights already reflect them
+FIT_ONLY_PARAMS = ("max_df", "min_df", "max_features", "vocabulary", "smooth_idf")
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _encode_strings(strings):
+    """Pack strings into a UTF-8 blob plus an offsets array"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(blob, offsets):
+    raw = blob.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _check_params(vectorizer, supported):
+    """Raise ValueError if the vectorizer sets a parameter the artifact's transform would ignore"""
+    defaults = type(vectorizer)().get_params()
+    params = vectorizer.get_params()
+    unsupported = sorted(
+        name for name, value in params.items()
+        if name not in supported and name not in FIT_ONLY_PARAMS and value != defaults.get(name)
+    )
+    if unsupported:
+        settings = ", ".join(f"{name}={params[name]!r}" for name in unsupported)
+        raise ValueError(f"Artifact export does not support {type(vectorizer).__name__} with {settings}; keep the pickles")
+    if params["norm"] not in ("l1", "l2", None):
+        raise ValueError(f"Artifact export does not support norm={params['norm']!r}")
+    return params
+
+
+def export_artifact(vectorizer, model, path=ARTIFACT_PATH, meta=None):
+    """Write a fitted TfidfVectorizer/HashingVectorizer and linear model to one artifact file
+
+    Returns:
+        str: the artifact version (content digest)
+    """
+    arrays = {}
+    if type(vectorizer).__name__ == "TfidfVectorizer":
+        params = _check_params(vectorizer, TFIDF_PARAMS)
+        # Terms as fixed-width UTF-8 in byte order, so lookups binary-search the mapped array
+        terms = sorted((term.encode("utf-8"), index) for term, index in vectorizer.vocabulary_.items())
+        arrays["vocab_terms"] = np.array([term for term, _ in terms], dtype=np.bytes_)
+        arrays["vocab_columns"] = np.array([index for _, index in terms], dtype=np.int64)
+        arrays["idf"] = np.asarray(vectorizer.idf_, dtype=np.float64)
+        features = {"kind": "tfidf", **{name: params[name] for name in TFIDF_PARAMS}}
+    elif type(vectorizer).__name__ == "HashingVectorizer":
+        params = _check_params(vectorizer, HASHING_PARAMS)
+        features = {"kind": "hashing", **{name: params[name] for name in HASHING_PARAMS}}
+    else:
+        raise ValueError(f"Unsupported vectorizer for artifact export: {type(vectorizer).__name__}")
+
+    arrays["coef"] = np.ascontiguousarray(model.coef_, dtype=np.float64)
+    arrays["intercept"] = np.ascontiguousarray(np.atleast_1d(model.intercept_), dtype=np.float64)
+    arrays["classes_blob"], arrays["classes_offsets"] = _encode_strings([str(c) for c in model.classes_])
+
+    # Meta (e.g. the calibration temperature) changes predictions, so it is part of the version
+    digest = hashlib.sha1(json.dumps([features, meta or {}], sort_keys=True).encode("utf-8"))
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        digest.update(array.tobytes())
+        offset = _align(offset)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    version = digest.hexdigest()[:12]
+
+    header = json.dumps({
+        "format": FORMAT_VERSION,
+        "version": version,
+        "features": features,
+        "arrays": layout,
+        "meta": meta or {},
+    }).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    # Atomic replace, so a server starting mid-export never sees a partial file
+    os.replace(tmp_path, path)
+    return version
+
+
+class TfidfFeatures:
+    """TF-IDF transform equivalent to the fitted TfidfVectorizer, over mapped idf weights
+
+    Tokens are looked up by binary search in the mapped, sorted term array, so
+    no worker builds its own vocabulary dict.
+    """
+
+    def __init__(self, terms, columns, idf, token_pattern, lowercase, norm, sublinear_tf):
+        self.terms = terms
+        self.columns = columns
+        self.idf = idf
+        self.token_re = re.compile(token_pattern)
+        self.lowercase = lowercase
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+
+    def lookup(self, tokens):
+        """Column of each token, -1 for tokens outside the vocabulary"""
+        if not tokens or not len(self.terms):
+            return np.full(len(tokens), -1, dtype=np.int64)
+        query = np.array([token.encode("utf-8") for token in tokens], dtype=np.bytes_)
+        positions = np.minimum(np.searchsorted(self.terms, query), len(self.terms) - 1)
+        return np.where(self.terms[positions] == query, self.columns[positions], -1)
+
+    def transform(self, docs):
+        tokens = []
+        lengths = []
+        for doc in docs:
+            if self.lowercase:
+                doc = doc.lower()
+            found = self.token_re.findall(doc)
+            tokens.extend(found)
+            lengths.append(len(found))
+
+        # One search for the whole batch; repeated (row, column) pairs are summed into counts
+        columns = self.lookup(tokens)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = columns >= 0
+        X = sp.csr_matrix(
+            (np.ones(int(known.sum()), dtype=np.float64), (rows[known], columns[known])),
+            shape=(len(lengths), len(self.idf)),
+        )
+        X.sum_duplicates()
+        if self.sublinear_tf:
+            np.log(X.data, out=X.data)
+            X.data += 1
+        X.data *= self.idf[X.indices]
+        if self.norm in ("l1", "l2"):
+            _normalize_rows(X, self.norm)
+        return X
+
+
+def _normalize_rows(X, norm):
+    row_ids = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+    values = X.data ** 2 if norm == "l2" else np.abs(X.data)
+    norms = np.bincount(row_ids, weights=values, minlength=X.shape[0])
+    if norm == "l2":
+        norms = np.sqrt(norms)
+    norms[norms == 0] = 1.0
+    X.data /= norms[row_ids]
+
+
+class LinearModel:
+    """decision_function/classes_ of a fitted linear classifier, over mapped weights"""
+
+    def __init__(self, coef, intercept, classes):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.classes_ = np.array(classes)
+
+    def decision_function(self, X):
+        scores = np.asarray(X @ self.coef_.T) + self.intercept_
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(int)]
+        return self.classes_[scores.argmax(axis=1)]
+
+
+class ModelArtifact:
+    def __init__(self, version, vectorizer, model, meta):
+        self.version = version
+        self.vectorizer = vectorizer
+        self.model = model
+        self.meta = meta
+
+
+def load_artifact(path=ARTIFACT_PATH):
+    """Map an artifact written by export_artifact()"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        header_len = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    if header["format"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {header['format']} in {path}")
+
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    data_start = _align(len(MAGIC) + 8 + header_len)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                     offset=data_start + spec["offset"]).reshape(spec["shape"])
+
+    features = header["features"]
+    if features["kind"] == "tfidf":
+        vectorizer = TfidfFeatures(
+            arrays["vocab_terms"],
+            arrays["vocab_columns"],
+            arrays["idf"],
+            features["token_pattern"],
+            features["lowercase"],
+            features["norm"],
+            features["sublinear_tf"],
+        )
+    else:
+        from sklearn.feature_extraction.text import HashingVectorizer
+        vectorizer = HashingVectorizer(
+            n_features=features["n_features"],
+            alternate_sign=features["alternate_sign"],
+            norm=features["norm"],
+            token_pattern=features["token_pattern"],
+            lowercase=features["lowercase"],
+            ngram_range=tuple(features["ngram_range"]),
+            binary=features["binary"],
+        )
+
+    model = LinearModel(
+        arrays["coef"],
+        arrays["intercept"],
+        _decode_strings(arrays["classes_blob"], arrays["classes_offsets"]),
+    )
+    return ModelArtifact(header["version"], vectorizer, model, header["meta"])
+
+
+def file_digest(*paths):
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def load_model(path=ARTIFACT_PATH):
+    """Load the artifact if it exists, else the legacy pickles
+
+    Returns:
+        tuple: (vectorizer, model, version, meta); the pickles carry no meta
+    """
+    if os.path.exists(path):
+        artifact = load_artifact(path)
+        return artifact.vectorizer, artifact.model, artifact.version, artifact.meta
+    vectorizer = pickle.load(open('vectorizer.pkl', 'rb'))
+    model = pickle.load(open('model.pkl', 'rb'))
+    return vectorizer, model, file_digest('vectorizer.pkl', 'model.pkl'), {}
+
+
+if __name__ == "__main__":
+    vectorizer = pickle.load(open('vectorizer.pkl', 'rb'))
+    model = pickle.load(open('model.pkl', 'rb'))
+    from preprocess import nltk_stop_words
+    # Bundle the stop words so servers never need the NLTK corpus
+    version = export_artifact(vectorizer, model, meta={"stopwords": sorted(nltk_stop_words())})
+    print(f"✓ Wrote {ARTIFACT_PATH} (version {version}, {os.path.getsize(ARTIFACT_PATH)} bytes)")
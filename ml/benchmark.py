@@ -0,0 +1,346 @@
+"""Reproducible benchmarks for the classification and analysis hot paths.
+
+Sections:
+    preprocess  preprocessing throughput, cold and warm stem cache
+    load        model load time (artifact and/or pickles) and server import (cold start) time
+    classify    single-text vs batch latency, p50/p99, with the prediction cache off
+    analyze     end-to-end /analyze over synthetic activities, cold then warm
+
+Gemini is replaced by a local stub with configurable latency and 429 rate.
+Mongo is an in-memory mongomock_motor instance unless --mongo-uri points at
+a real (throwaway) server; the benchmark drops the collection it writes to.
+mongomock_motor is optional and only needed for the default analyze run:
+    pip install mongomock-motor
+
+Results are printed as JSON and optionally written with --output, e.g.
+    python benchmark.py --activities 5000 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# The stub stands in for Gemini, so pace it like a local service, not a quota.
+# Set before analyse.py reads them; explicit environment values still win.
+os.environ.setdefault("GEMINI_RPM", "600000")
+os.environ.setdefault("GEMINI_CONCURRENCY", "8")
+os.environ.setdefault("GEMINI_BACKOFF_BASE", "0.01")
+os.environ.setdefault("GEMINI_BACKOFF_MAX", "0.1")
+# Never reach the real API, even if .env has a key
+os.environ["GEMINI_API_KEY"] = ""
+
+import numpy as np
+
+WORDS = (
+    "online shopping books electronics clothes shoes news politics world sports "
+    "entertainment university college education courses learning health fitness "
+    "nutrition diet exercise wellness football soccer basketball scores travel hotels "
+    "flights vacation booking tourism games streaming music videos movies software "
+    "programming code developer cloud finance banking stocks investing recipes food "
+    "cooking weather forecast science research space technology reviews forum social"
+).split()
+DOMAINS = ["example", "shop", "daily-news", "learnhub", "fitlife", "scoreboard", "tripplanner",
+           "devtools", "moneywise", "kitchen", "skywatch", "gamerzone"]
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds"""
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(ms),
+        "mean": round(float(ms.mean()), 4),
+        "p50": round(float(np.percentile(ms, 50)), 4),
+        "p99": round(float(np.percentile(ms, 99)), 4),
+        "max": round(float(ms.max()), 4),
+    }
+
+
+def synthetic_texts(count, rng, min_words=8, max_words=40):
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def synthetic_activities(count, pages, rng):
+    """`count` visits spread over `pages` unique pages"""
+    catalog = []
+    for idx in range(pages):
+        domain = rng.choice(DOMAINS)
+        catalog.append((f"https://www.{domain}.com/{idx}?utm_source=bench", " ".join(rng.choice(WORDS) for _ in range(4))))
+    now = datetime.now()
+    activities = []
+    for idx in range(count):
+        url, title = catalog[rng.randrange(pages)]
+        start = now - timedelta(minutes=count - idx)
+        duration = rng.randint(5, 600)
+        activities.append({
+            "url": url,
+            "title": title,
+            "startTime": start,
+            "endTime": start + timedelta(seconds=duration),
+            "duration": duration,
+        })
+    return activities
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGemini:
+    """generate_content() with a fixed latency and a random share of 429 errors"""
+
+    def __init__(self, latency_ms, rate_limit_rate, seed):
+        self.latency = latency_ms / 1000
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            limited = self._rng.random() < self.rate_limit_rate
+            self.rate_limited += limited
+        if limited:
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        return StubResponse(f"Stub description for {prompt[-120:]}")
+
+
+def bench_preprocess(args, rng):
+    import preprocess
+    from preprocess import preprocess_batch, stem_token
+
+    # Import NLTK up front so "cold" measures the stem cache, not the import
+    if preprocess.port_stemmer is None:
+        preprocess.load()
+    texts = synthetic_texts(args.texts, rng)
+    words = sum(len(text.split()) for text in texts)
+    results = {"texts": len(texts), "words": words}
+    for label in ("cold", "warm"):
+        if label == "cold":
+            stem_token.cache_clear()
+        start = time.perf_counter()
+        preprocess_batch(texts)
+        elapsed = time.perf_counter() - start
+        results[label] = {
+            "seconds": round(elapsed, 4),
+            "textsPerSecond": round(len(texts) / elapsed, 1),
+            "wordsPerSecond": round(words / elapsed, 1),
+        }
+    return results
+
+
+def bench_load(args):
+    from artifact import ARTIFACT_PATH, load_artifact, file_digest
+    import pickle
+
+    results = {}
+    if os.path.exists(ARTIFACT_PATH):
+        samples = []
+        for _ in range(args.load_repeats):
+            start = time.perf_counter()
+            load_artifact(ARTIFACT_PATH)
+            samples.append(time.perf_counter() - start)
+        results["artifact"] = percentiles(samples)
+    if os.path.exists("vectorizer.pkl") and os.path.exists("model.pkl"):
+        samples = []
+        for _ in range(args.load_repeats):
+            start = time.perf_counter()
+            pickle.load(open("vectorizer.pkl", "rb"))
+            pickle.load(open("model.pkl", "rb"))
+            file_digest("vectorizer.pkl", "model.pkl")
+            samples.append(time.perf_counter() - start)
+        results["pickles"] = percentiles(samples)
+    # Time to import each server module in a fresh interpreter, i.e. before uvicorn can accept connections.
+    # Any cache files they open go to a temporary directory, not the working tree.
+    cache_dir = tempfile.mkdtemp(prefix="bench-")
+    env = {
+        **os.environ,
+        "DESCRIPTION_CACHE_PATH": os.path.join(cache_dir, "descriptions.sqlite3"),
+        "DOMAIN_INDEX_PATH": os.path.join(cache_dir, "domains.sqlite3"),
+    }
+    for module in ("app", "analyse"):
+        samples = []
+        for _ in range(args.load_repeats):
+            code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+            completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+            if completed.returncode != 0:
+                break
+            samples.append(float(completed.stdout.strip().splitlines()[-1]))
+        if samples:
+            results[f"import{module.capitalize()}"] = percentiles(samples)
+    return results
+
+
+def bench_classify(args, rng):
+    import classifier
+
+    texts = synthetic_texts(args.texts, rng)
+    # Measure the model, not the cache
+    classifier.prediction_cache.clear()
+    single = []
+    for text in texts[:args.single]:
+        classifier.prediction_cache.clear()
+        start = time.perf_counter()
+        classifier.classify_batch([text])
+        single.append(time.perf_counter() - start)
+
+    batches = {}
+    for size in args.batch_sizes:
+        samples = []
+        for offset in range(0, len(texts) - size + 1, size):
+            classifier.prediction_cache.clear()
+            start = time.perf_counter()
+            classifier.classify_batch(texts[offset:offset + size])
+            samples.append(time.perf_counter() - start)
+        if samples:
+            summary = percentiles(samples)
+            summary["perTextMs"] = round(summary["mean"] / size, 4)
+            batches[str(size)] = summary
+
+    # Every text cached: the repeat-visit path
+    classifier.classify_batch(texts[:args.single])
+    cached = []
+    for text in texts[:args.single]:
+        start = time.perf_counter()
+        classifier.classify_batch([text])
+        cached.append(time.perf_counter() - start)
+
+    return {
+        "modelVersion": classifier.MODEL_VERSION,
+        "single": percentiles(single),
+        "singleCached": percentiles(cached),
+        "batch": batches,
+    }
+
+
+def bench_analyze(args, rng):
+    cache_dir = tempfile.mkdtemp(prefix="bench-")
+    # A fresh description cache and domain index, so the cold run really goes to the stub
+    os.environ["DESCRIPTION_CACHE_PATH"] = os.path.join(cache_dir, "descriptions.sqlite3")
+    os.environ["DOMAIN_INDEX_PATH"] = os.path.join(cache_dir, "domains.sqlite3")
+    # Keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        import analyse
+
+    stub = StubGemini(args.gemini_latency_ms, args.gemini_429_rate, args.seed)
+    analyse.GEMINI_API_KEY = "stub"
+    analyse.model_gemini = stub
+    analyse.prediction_cache.clear()
+
+    if args.mongo_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo = AsyncIOMotorClient(args.mongo_uri)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise RuntimeError("The analyze section needs mongomock_motor (pip install mongomock-motor) or --mongo-uri")
+        mongo = AsyncMongoMockClient()
+    analyse.db = mongo["third_eye_benchmark"]
+    analyse.collection = analyse.db["activities"]
+
+    activities = synthetic_activities(args.activities, args.pages, rng)
+
+    async def run():
+        await analyse.collection.drop()
+        await analyse.collection.insert_many(activities)
+        runs = {}
+        for label in ("cold", "warm"):
+            calls_before, limited_before = stub.calls, stub.rate_limited
+            # Per-page prints would dominate the timing
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                response = await analyse.analyze_websites(hours=None)
+                elapsed = time.perf_counter() - start
+            if "error" in response:
+                raise RuntimeError(response["error"])
+            runs[label] = {
+                "seconds": round(elapsed, 4),
+                "activitiesPerSecond": round(len(activities) / elapsed, 1),
+                "analyzed": response["analyzed"],
+                "reused": response["reused"],
+                "unique": response["unique"],
+                "geminiCalls": stub.calls - calls_before,
+                "geminiRateLimited": stub.rate_limited - limited_before,
+                "fallbacks": response["descriptionFetch"]["fallbacks"],
+                "localDescriptions": response["descriptionFetch"]["local"],
+                "domainIndexResolved": response["domainIndex"]["resolved"],
+            }
+        await analyse.collection.drop()
+        return runs
+
+    results = {
+        "activities": len(activities),
+        "pages": args.pages,
+        "geminiLatencyMs": args.gemini_latency_ms,
+        "gemini429Rate": args.gemini_429_rate,
+        "mongo": "server" if args.mongo_uri else "mongomock",
+    }
+    results.update(asyncio.run(run()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, classification and /analyze")
+    parser.add_argument("--sections", default="preprocess,load,classify,analyze",
+                        help="comma-separated subset of preprocess,load,classify,analyze")
+    parser.add_argument("--texts", type=int, default=20000, help="synthetic texts for preprocess/classify")
+    parser.add_argument("--single", type=int, default=500, help="single-text classify calls to time")
+    parser.add_argument("--batch-sizes", default="16,128,1024", help="batch sizes for the classify section")
+    parser.add_argument("--load-repeats", type=int, default=5, help="model loads to time")
+    parser.add_argument("--activities", type=int, default=2000, help="synthetic activities for /analyze")
+    parser.add_argument("--pages", type=int, default=300, help="unique pages among the activities")
+    parser.add_argument("--gemini-latency-ms", type=float, default=50.0, help="stub Gemini latency per call")
+    parser.add_argument("--gemini-429-rate", type=float, default=0.05, help="share of stub calls that return 429")
+    parser.add_argument("--mongo-uri", default=None, help="use this Mongo server instead of mongomock (pip install mongomock-motor)")
+    parser.add_argument("--seed", type=int, default=43)
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    args = parser.parse_args()
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size]
+    sections = [name.strip() for name in args.sections.split(",") if name.strip()]
+
+    rng = random.Random(args.seed)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "args": {key: value for key, value in vars(args).items() if key != "output"},
+        }
+    }
+    for name in sections:
+        print(f"Running {name}...", file=sys.stderr)
+        if name == "preprocess":
+            report[name] = bench_preprocess(args, rng)
+        elif name == "load":
+            report[name] = bench_load(args)
+        elif name == "classify":
+            report[name] = bench_classify(args, rng)
+        elif name == "analyze":
+            report[name] = bench_analyze(args, rng)
+        else:
+            parser.error(f"unknown section: {name}")
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,197 @@
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import LabelEncoder
-import nltk
 import string
 import pickle
-from nltk.stem.porter import PorterStemmer
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import TfidfVectorizer
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
 from sklearn.model_selection import train_test_split
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.metrics import accuracy_score, classification_report
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import classification_report
+from sklearn.svm import LinearSVC
+import scipy.sparse as sp
 import emoji
-import re
-import nltk
-from nltk import PorterStemmer
-from nltk.corpus import stopwords
-
-# Download required NLTK data
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
-stop_words = set(stopwords.words('english'))
-# Read dataset
-try:
-    df = pd.read_csv("./dataset/website_classification.csv", encoding='latin1', on_bad_lines='skip', header=0)
-except TypeError:
-    df = pd.read_csv("./dataset/website_classification.csv", encoding='latin1', error_bad_lines=False, warn_bad_lines=True, header=0)
-
-# df.info()
-# df.isna().sum()
-# df.shape
-# df["Category"].value_counts()
-
-port_stemmer = PorterStemmer()
-def preprocessing(text):
-    text = text.lower()
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"[^a-zA-Z]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r'[^\w\s,.!?]', '', text)  # removes most emojis & symbols
-    text = text.split()
-    text = [port_stemmer.stem(word) for word in text if not word in stop_words]
-    return text
-
-df["preprocessed_text"] = df["cleaned_website_text"].apply(preprocessing)
-
-from sklearn.feature_extraction.text import TfidfVectorizer
-
-df["preprocessed_text"] = df["preprocessed_text"].apply(lambda text: " ".join(text))
-vectorizer = TfidfVectorizer(max_features=5000)
-X_tfidf = vectorizer.fit_transform(df["preprocessed_text"])
-X = X_tfidf
-Y = df["Category"].values
+import preprocess
+from preprocess import preprocess_batch
+from artifact import ARTIFACT_PATH, export_artifact
+from scoring import fit_temperature
+import domain_index
 
-from sklearn.model_selection import train_test_split
-x_train,x_test,y_train,y_test = train_test_split(X,Y,test_size = 0.3 , stratify = Y,random_state=43)
-# lr = LogisticRegression()
-# lr.fit(x_train,y_train)
-# y_pred = lr.predict(x_test)
-# print(classification_report(y_pred,y_test , zero_division=True))
-# from sklearn.ensemble import RandomForestClassifier
-# rfc = RandomForestClassifier()
-# rfc.fit(x_train,y_train)
-# y_pred = rfc.predict(x_test)
-# print(classification_report(y_pred,y_test,zero_division=True))
-from sklearn.svm import LinearSVC
-svc = LinearSVC()
-svc.fit(x_train,y_train)
-y_pred = svc.predict(x_test)
-print(classification_report(y_pred,y_test,zero_division=True))
+DATASET_PATH = "./dataset/website_classification.csv"
+
+def read_dataset(**kwargs):
+    """Read the dataset CSV; extra kwargs (chunksize, usecols, ...) go to pandas"""
+    try:
+        return pd.read_csv(DATASET_PATH, encoding='latin1', on_bad_lines='skip', header=0, **kwargs)
+    except TypeError:
+        return pd.read_csv(DATASET_PATH, encoding='latin1', error_bad_lines=False, warn_bad_lines=True, header=0, **kwargs)
+
+def calibration_meta(model, x_held_out, y_held_out):
+    """Fit the softmax temperature that turns decision scores into calibrated probabilities"""
+    label_indices = np.searchsorted(model.classes_, y_held_out)
+    temperature = fit_temperature(model.decision_function(x_held_out), label_indices)
+    print(f"✓ Calibration: softmax temperature {temperature:.4f} on {len(label_indices)} held-out rows")
+    return {"calibration": {"method": "softmax_temperature", "temperature": temperature, "rows": int(len(label_indices))}}
+
+def save_model(vectorizer, model, labels, meta=None):
+    pickle.dump(vectorizer, open('vectorizer.pkl', 'wb'))
+    pickle.dump(model, open('model.pkl', 'wb'))
+    pickle.dump(LabelEncoder().fit(labels), open('encoder.pkl', 'wb'))
+    # The stop words used in training ship with the model, so servers never need the NLTK corpus.
+    # --chunked preprocesses in worker processes, so this one may not have loaded them yet
+    if preprocess.port_stemmer is None:
+        preprocess.load()
+    meta = {**(meta or {}), "stopwords": sorted(preprocess.stop_words)}
+    try:
+        version = export_artifact(vectorizer, model, meta=meta)
+    except ValueError as e:
+        # Servers prefer the artifact, so an older one would shadow the new pickles
+        if os.path.exists(ARTIFACT_PATH):
+            os.remove(ARTIFACT_PATH)
+        print(f"⚠️ Saved the pickles only; no artifact for this vectorizer: {e}")
+        return
+    print(f"✓ Saved model (artifact version {version})")
+
+def train_in_memory():
+    """Original pipeline: whole CSV in RAM, TF-IDF (5000 terms) + LinearSVC"""
+    df = read_dataset()
+
+    # df.info()
+    # df.isna().sum()
+    # df.shape
+    # df["Category"].value_counts()
+
+    # Same preprocessing the API servers apply at prediction time
+    df["preprocessed_text"] = preprocess_batch(df["cleaned_website_text"])
+
+    vectorizer = TfidfVectorizer(max_features=5000)
+    X_tfidf = vectorizer.fit_transform(df["preprocessed_text"])
+    X = X_tfidf
+    Y = df["Category"].values
+
+    x_train,x_test,y_train,y_test = train_test_split(X,Y,test_size = 0.3 , stratify = Y,random_state=43)
+    # lr = LogisticRegression()
+    # lr.fit(x_train,y_train)
+    # y_pred = lr.predict(x_test)
+    # print(classification_report(y_pred,y_test , zero_division=True))
+    # from sklearn.ensemble import RandomForestClassifier
+    # rfc = RandomForestClassifier()
+    # rfc.fit(x_train,y_train)
+    # y_pred = rfc.predict(x_test)
+    # print(classification_report(y_pred,y_test,zero_division=True))
+    svc = LinearSVC()
+    svc.fit(x_train,y_train)
+    y_pred = svc.predict(x_test)
+    print(classification_report(y_pred,y_test,zero_division=True))
+
+    save_model(vectorizer, svc, Y, calibration_meta(svc, x_test, y_test))
+
+def read_chunks(chunk_size):
+    """Yield (texts, labels) chunks, skipping rows without text or label"""
+    for chunk in read_dataset(usecols=["cleaned_website_text", "Category"], chunksize=chunk_size):
+        chunk = chunk.dropna()
+        yield chunk["cleaned_website_text"].astype(str).tolist(), chunk["Category"].astype(str).values
+
+def preprocessed_chunks(chunk_size, workers):
+    """Preprocess chunks on a process pool, keeping at most 2 * workers chunks in flight"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for texts, labels in read_chunks(chunk_size):
+            in_flight.append((pool.submit(preprocess_batch, texts), labels))
+            if len(in_flight) >= 2 * workers:
+                future, labels = in_flight.popleft()
+                yield future.result(), labels
+        while in_flight:
+            future, labels = in_flight.popleft()
+            yield future.result(), labels
+
+def train_chunked(chunk_size, workers, n_features, holdout, max_holdout_rows):
+    """Out-of-core pipeline: streamed CSV, parallel preprocessing, hashed features + SGD hinge loss.
+
+    Memory is bounded by the chunk size, the hashing space and the held-out
+    evaluation sample, not by the size of the dataset.
+    """
+    # Pass 1: the label set, which partial_fit needs up front
+    classes = set()
+    for chunk in read_dataset(usecols=["Category"], chunksize=chunk_size):
+        classes.update(chunk["Category"].dropna().astype(str))
+    classes = np.array(sorted(classes))
+    print(f"Classes: {len(classes)}")
+
+    # Stateless, so nothing to fit and no vocabulary to hold in memory
+    vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
+    model = SGDClassifier(loss="hinge", alpha=1e-5, random_state=43)
+
+    rng = np.random.default_rng(43)
+    x_test, y_test = [], []
+    test_rows = 0
+    trained_rows = 0
+    for idx, (texts, labels) in enumerate(preprocessed_chunks(chunk_size, workers), 1):
+        X = vectorizer.transform(texts)
+        test_mask = rng.random(len(labels)) < holdout
+        if test_rows >= max_holdout_rows:
+            test_mask[:] = False
+        if test_mask.any():
+            x_test.append(X[test_mask])
+            y_test.append(labels[test_mask])
+            test_rows += int(test_mask.sum())
+        train_mask = ~test_mask
+        if train_mask.any():
+            model.partial_fit(X[train_mask], labels[train_mask], classes=classes)
+            trained_rows += int(train_mask.sum())
+        print(f"Chunk {idx}: {trained_rows} rows trained, {test_rows} held out")
+
+    meta = None
+    if x_test:
+        x_test, y_test = sp.vstack(x_test), np.concatenate(y_test)
+        y_pred = model.predict(x_test)
+        print(classification_report(y_pred, y_test, zero_division=True))
+        meta = calibration_meta(model, x_test, y_test)
+
+    save_model(vectorizer, model, classes, meta)
+
+def build_domain_index(chunk_size):
+    """Seed the domain index with the dataset's website_url -> Category labels"""
+    index = domain_index.from_env()
+    # Rebuilt from scratch so rerunning does not double-count rows
+    index.forget(domain_index.DATASET_VERSION)
+    rows = 0
+    for chunk in read_dataset(usecols=["website_url", "Category"], chunksize=chunk_size):
+        chunk = chunk.dropna()
+        labels = chunk["Category"].astype(str).tolist()
+        # Labels are ground truth: full confidence, lowered only where a domain has several labels
+        index.learn(zip(chunk["website_url"].astype(str), labels, [100.0] * len(labels)), domain_index.DATASET_VERSION)
+        rows += len(labels)
+    print(f"✓ Domain index: {index.stats()['labelledDomains']} labelled domains from {rows} rows ({index.path})")
 
-pickle.dump(vectorizer, open('vectorizer.pkl', 'wb'))
-pickle.dump(svc, open('model.pkl', 'wb'))
-pickle.dump(LabelEncoder().fit(Y), open('encoder.pkl', 'wb'))       
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the website category classifier")
+    parser.add_argument("--chunked", action="store_true",
+                        help="stream the CSV in chunks and train out-of-core (hashed features + SGD)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="rows per chunk in --chunked mode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="preprocessing processes in --chunked mode")
+    parser.add_argument("--n-features", type=int, default=2 ** 20,
+                        help="hashing space size in --chunked mode")
+    parser.add_argument("--holdout", type=float, default=0.1,
+                        help="fraction of rows held out for evaluation in --chunked mode")
+    parser.add_argument("--max-holdout-rows", type=int, default=200000,
+                        help="cap on held-out rows kept in memory in --chunked mode")
+    parser.add_argument("--no-domain-index", action="store_true",
+                        help="do not rebuild the domain index from the dataset after training")
+    parser.add_argument("--domain-index-only", action="store_true",
+                        help="only rebuild the domain index from the dataset; no training")
+    args = parser.parse_args()
 
+    if not args.domain_index_only:
+        if args.chunked:
+            train_chunked(args.chunk_size, args.workers, args.n_features, args.holdout, args.max_holdout_rows)
+        else:
+            train_in_memory()
+    if args.domain_index_only or not args.no_domain_index:
+        build_domain_index(args.chunk_size)
@@ -0,0 +1,101 @@
+import os
+import time
+import model_registry
+from scoring import rank_predictions
+from prediction_cache import PredictionCache, text_key
+from metrics import STAGE_SECONDS, CACHE_LOOKUPS
+
+# Runner-up categories returned with each prediction
+PREDICTION_ALTERNATIVES = int(os.getenv("PREDICTION_ALTERNATIVES", "2"))
+
+# Predictions per preprocessed text; many activities share the same title + description
+prediction_cache = PredictionCache(int(os.getenv("PREDICTION_CACHE_SIZE", "50000")))
+
+# The active model (the memory-mapped artifact if present, else the pickles), hot-reloaded
+# by registry.watch() and optionally shadowed by a candidate
+registry = model_registry.from_env()
+
+
+def __getattr__(name):
+    # MODEL_VERSION, vectorizer, model, model_meta and TEMPERATURE follow the active model
+    attributes = {"MODEL_VERSION": "version", "vectorizer": "vectorizer", "model": "model",
+                  "model_meta": "meta", "TEMPERATURE": "temperature"}
+    if name in attributes:
+        active = registry.active
+        return getattr(active, attributes[name]) if active is not None else None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def load():
+    """Load the model and the preprocessing resources it was trained with
+
+    Importing this module is cheap; servers call load() from a warm-up task
+    and everything else loads on the first classify_batch() call.
+
+    Returns:
+        dict: milliseconds spent per step, empty if the model was already loaded
+    """
+    return registry.load()
+
+
+def is_loaded() -> bool:
+    return registry.active is not None
+
+
+def current_model():
+    """The active LoadedModel; hold on to it to score a whole run with one version"""
+    if registry.active is None:
+        registry.load()
+    return registry.active
+
+
+def classify_batch(texts, loaded=None):
+    """Classify many texts with a single transform and a single decision_function call
+
+    Texts whose preprocessed form is already cached for this model version
+    skip the model; the rest are deduplicated and scored together. Category,
+    confidence and runner-ups all come from that one score matrix.
+
+    Args:
+        loaded: LoadedModel to score with, the active one by default. A model
+            that has since been replaced bypasses the prediction cache.
+
+    Returns:
+        list: (category, confidence, alternatives) tuples, one per text
+    """
+    if not texts:
+        return []
+    loaded = loaded or current_model()
+    cached = loaded is registry.active
+    with STAGE_SECONDS.time(stage="preprocess"):
+        processed = loaded.preprocess(texts)
+    keys = [text_key(text) for text in processed]
+    predictions = prediction_cache.get_many(loaded.version, keys) if cached else [None] * len(keys)
+
+    # key -> position of its first text, for the texts the cache did not answer
+    missing = {}
+    for position, (key, prediction) in enumerate(zip(keys, predictions)):
+        if prediction is None:
+            missing.setdefault(key, position)
+    if cached:
+        misses = sum(prediction is None for prediction in predictions)
+        CACHE_LOOKUPS.inc(len(keys) - misses, cache="prediction", result="hit")
+        CACHE_LOOKUPS.inc(misses, cache="prediction", result="miss")
+    if missing:
+        unique = [processed[position] for position in missing.values()]
+        start = time.perf_counter()
+        with STAGE_SECONDS.time(stage="vectorize"):
+            vectorized = loaded.vectorizer.transform(unique)
+        with STAGE_SECONDS.time(stage="predict"):
+            categories, confidences, alternatives = rank_predictions(
+                loaded.model.classes_, loaded.model.decision_function(vectorized),
+                PREDICTION_ALTERNATIVES, loaded.temperature
+            )
+        registry.maybe_shadow(loaded, [texts[position] for position in missing.values()], unique, categories,
+                              time.perf_counter() - start)
+        scored = dict(zip(missing.keys(), zip(categories, confidences, alternatives)))
+        if cached:
+            prediction_cache.put_many(loaded.version, scored.items())
+        predictions = [prediction if prediction is not None else scored[key]
+                       for key, prediction in zip(keys, predictions)]
+    return predictions
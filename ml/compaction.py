@@ -0,0 +1,199 @@
+"""Merge runs of short same-URL activities into sessions.
+
+The extension posts one activity per tab switch or close, so a page read in
+several stints becomes many small documents. compact() walks a time range in
+startTime order and folds each activity into the open session for its URL
+when it starts no more than `gap_seconds` after that session ends, or
+overlaps it.
+
+A session keeps its earliest document and that document's title and analysis.
+Its endTime becomes the latest end, its duration the sum of the members'
+durations, and sessionRecords the number of raw activities folded into it.
+The other documents are deleted. If a raw collection is given, they are first
+copied there unchanged. Compacting the same range again changes nothing.
+
+Cursors are not snapshots, so two compactors over one range could each read
+part of a session the other deletes and overwrite its sums with smaller ones.
+Given a lock collection, compact() therefore holds a lease document while it
+runs, renewed like a job's heartbeat; a second compactor, in this process or
+another uvicorn worker, raises CompactionRunning instead of starting. A lease
+whose holder died expires after LEASE_SECONDS.
+
+Every write stamps updatedAt with the server time, and every deleted document
+leaves a tombstone (its _id, startTime, the session it went into and
+deletedAt), so the columnar export picks up both changes.
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne, DeleteMany, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import find_batches
+from metrics import ACTIVITIES_COMPACTED
+
+# Deleted activities, read by the columnar export; tombstones expire after TOMBSTONE_TTL_DAYS (0 keeps them)
+TOMBSTONE_COLLECTION = os.getenv("COMPACTION_TOMBSTONE_COLLECTION", "activities_deleted")
+TOMBSTONE_TTL_DAYS = float(os.getenv("COMPACTION_TOMBSTONE_TTL_DAYS", "90"))
+
+# Lease held by the running compactor; it is renewed every third of LEASE_SECONDS
+LOCK_COLLECTION = os.getenv("COMPACTION_LOCK_COLLECTION", "locks")
+LEASE_ID = "compaction"
+LEASE_SECONDS = float(os.getenv("COMPACTION_LEASE_SECONDS", "120"))
+
+
+class CompactionRunning(Exception):
+    """Raised by compact() when another compactor holds the lease"""
+
+
+def lease_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def acquire_lease(lock_coll, owner, seconds=LEASE_SECONDS):
+    """Take or renew the compaction lease; False if another owner holds an unexpired one"""
+    now = lease_now()
+    try:
+        lease = await lock_coll.find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"owner": owner}, {"expiresAt": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expiresAt": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The filter missed because someone else holds it, and the upsert hit the existing _id
+        return False
+    return lease is not None and lease["owner"] == owner
+
+
+async def release_lease(lock_coll, owner):
+    await lock_coll.delete_one({"_id": LEASE_ID, "owner": owner})
+
+
+async def keep_lease(lock_coll, owner, seconds=LEASE_SECONDS):
+    while True:
+        await asyncio.sleep(seconds / 3)
+        await acquire_lease(lock_coll, owner, seconds)
+
+
+def activity_end(activity):
+    """endTime, or startTime + duration for records without one"""
+    end = activity.get("endTime")
+    if end is None:
+        end = activity["startTime"] + timedelta(seconds=activity.get("duration") or 0)
+    return end
+
+
+def new_session(activity):
+    return {"members": [activity], "end": max(activity_end(activity), activity["startTime"])}
+
+
+async def write_sessions(coll, raw_coll, tombstone_coll, sessions, stats):
+    """Persist the closed sessions that merged two or more activities"""
+    operations = []
+    archive = []
+    tombstones = []
+    merged = 0
+    for session in sessions:
+        members = session["members"]
+        if len(members) < 2:
+            continue
+        operations.append(UpdateOne({"_id": members[0]["_id"]}, {
+            "$set": {
+                "endTime": session["end"],
+                "duration": sum(member.get("duration") or 0 for member in members),
+                "sessionRecords": sum(member.get("sessionRecords", 1) for member in members)
+            },
+            "$currentDate": {"updatedAt": True}
+        }))
+        operations.append(DeleteMany({"_id": {"$in": [member["_id"] for member in members[1:]]}}))
+        tombstones.extend(UpdateOne(
+            {"_id": member["_id"]},
+            {"$set": {"startTime": member["startTime"], "mergedInto": members[0]["_id"]},
+             "$currentDate": {"deletedAt": True}},
+            upsert=True
+        ) for member in members[1:])
+        # A member that is itself a session was archived as raw records when it was compacted
+        archive.extend(ReplaceOne({"_id": member["_id"]}, member, upsert=True)
+                       for member in members if "sessionRecords" not in member)
+        merged += len(members) - 1
+    if raw_coll is not None and archive:
+        # Archive before deleting, so an interrupted run never loses a raw record
+        await raw_coll.bulk_write(archive, ordered=False)
+        stats["archived"] += len(archive)
+    if tombstone_coll is not None and tombstones:
+        # Also before deleting: an interrupted run leaves a tombstone for a document the next run deletes
+        await tombstone_coll.bulk_write(tombstones, ordered=False)
+    if operations:
+        await coll.bulk_write(operations, ordered=False)
+        stats["sessions"] += len(operations) // 2
+        stats["merged"] += merged
+        ACTIVITIES_COMPACTED.inc(merged)
+
+
+async def compact(coll, query, gap_seconds=60, raw_coll=None, batch_size=500, tombstone_coll=None,
+                  lock_coll=None):
+    """Merge the same-URL activities matching `query` that lie within `gap_seconds` of each other
+
+    Only the sessions that are still open are held in memory; a session is
+    written once the cursor has moved more than the gap past its end.
+
+    Args:
+        coll: activities collection
+        query: Mongo filter selecting the range to compact
+        gap_seconds: largest pause between two activities of one session
+        raw_coll: collection receiving the merged raw records, or None to drop them
+        tombstone_coll: collection recording the deleted ids for the export, or None
+        lock_coll: collection holding the compaction lease, or None when nothing else compacts
+
+    Returns:
+        dict: scanned activities, sessions written, activities merged away and raw records archived
+
+    Raises:
+        CompactionRunning: another compactor holds the lease
+    """
+    if lock_coll is None:
+        return await compact_range(coll, query, gap_seconds, raw_coll, batch_size, tombstone_coll)
+    owner = uuid.uuid4().hex
+    if not await acquire_lease(lock_coll, owner):
+        raise CompactionRunning("Another compaction is running")
+    renewal = asyncio.create_task(keep_lease(lock_coll, owner))
+    try:
+        return await compact_range(coll, query, gap_seconds, raw_coll, batch_size, tombstone_coll)
+    finally:
+        renewal.cancel()
+        await release_lease(lock_coll, owner)
+
+
+async def compact_range(coll, query, gap_seconds, raw_coll, batch_size, tombstone_coll):
+    stats = {"scanned": 0, "sessions": 0, "merged": 0, "archived": 0}
+    gap = timedelta(seconds=gap_seconds)
+    open_sessions = {}
+    closed = []
+    sort = [("startTime", 1), ("_id", 1)]
+    async for batch in find_batches(coll, query, sort=sort, batch_size=batch_size):
+        last_start = None
+        for activity in batch:
+            stats["scanned"] += 1
+            url, start = activity.get("url"), activity.get("startTime")
+            if not url or start is None:
+                continue
+            last_start = start
+            session = open_sessions.get(url)
+            if session is not None and start <= session["end"] + gap:
+                session["members"].append(activity)
+                session["end"] = max(session["end"], activity_end(activity))
+            else:
+                if session is not None:
+                    closed.append(session)
+                open_sessions[url] = new_session(activity)
+        if last_start is not None:
+            # Nothing later in the cursor can extend these any more
+            for url in [url for url, session in open_sessions.items() if session["end"] + gap < last_start]:
+                closed.append(open_sessions.pop(url))
+        if len(closed) >= batch_size:
+            await write_sessions(coll, raw_coll, tombstone_coll, closed, stats)
+            closed = []
+    closed.extend(open_sessions.values())
+    await write_sessions(coll, raw_coll, tombstone_coll, closed, stats)
+    return stats
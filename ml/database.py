@@ -0,0 +1,45 @@
+import os
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from metrics import STAGE_SECONDS
+
+# Load environment variables
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+
+# Pool and timeout tuning; every endpoint shares this one client
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_QUERY_TIMEOUT_MS = int(os.getenv("MONGO_QUERY_TIMEOUT_MS", "30000"))
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "500"))
+
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+)
+db = client["third_eye"]  # Database name: third_eye
+collection = db["activities"]  # Collection name: activities
+
+
+async def find_batches(coll, query, projection=None, sort=None, batch_size=MONGO_BATCH_SIZE, limit=0):
+    """Yield lists of up to `batch_size` documents, one list per server round-trip"""
+    cursor = coll.find(query, projection, batch_size=batch_size, limit=limit, max_time_ms=MONGO_QUERY_TIMEOUT_MS)
+    if sort:
+        cursor = cursor.sort(sort)
+    while True:
+        with STAGE_SECONDS.time(stage="mongo_fetch"):
+            batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            return
+        yield batch
+
+
+async def find_all(coll, query, projection=None, sort=None, limit=0):
+    """Every matching document, read in MONGO_BATCH_SIZE batches"""
+    documents = []
+    async for batch in find_batches(coll, query, projection, sort, limit=limit):
+        documents.extend(batch)
+    return documents
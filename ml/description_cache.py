@@ -0,0 +1,160 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from; they never change the page
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "ref", "ref_src", "igshid", "si"}
+
+
+def normalize_url(url: str) -> str:
+    """Reduce a URL to a canonical form so visits to the same page share a cache entry"""
+    url = (url or "").strip()
+    try:
+        parts = urlparse(url)
+    except ValueError:
+        return url.lower()
+
+    netloc = parts.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    path = parts.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunparse((parts.scheme.lower(), netloc, path, "", urlencode(query), ""))
+
+
+def cache_key(url: str, title: str = "") -> str:
+    """Content address of a (normalized URL, title) pair"""
+    raw = f"{normalize_url(url)}\n{(title or '').strip()}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DescriptionCache:
+    """Two-level description cache: an in-process LRU in front of a SQLite table.
+
+    Entries expire after `ttl_seconds`. The SQLite table is trimmed to
+    `max_entries` rows by least recent use, the memory layer to `memory_entries`.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, memory_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS descriptions (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                title TEXT,
+                description TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON descriptions (last_used)")
+        self._conn.commit()
+
+    def _remember(self, key, description, created_at):
+        self._memory[key] = (description, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, url: str, title: str = ""):
+        """Return the cached description, or None on a miss or an expired entry"""
+        key = cache_key(url, title)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = self._conn.execute(
+                "SELECT description, created_at FROM descriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM descriptions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE descriptions SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def put(self, url: str, title: str, description: str):
+        key = cache_key(url, title)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, url, title, description, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), title or "", description, now, now),
+            )
+            self._puts += 1
+            if self._puts % 256 == 0:
+                self._evict()
+            self._conn.commit()
+            self._remember(key, description, now)
+
+    def _evict(self):
+        # Called every few hundred writes; expiry and the size cap are both enforced lazily
+        self._conn.execute("DELETE FROM descriptions WHERE created_at <= ?", (time.time() - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM descriptions WHERE key IN "
+                "(SELECT key FROM descriptions ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def entries(self):
+        """(normalized url, description) of every stored entry, for learning from past output"""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, description FROM descriptions").fetchall()
+        return rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            (stored,) = self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memoryHits": self.memory_hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memoryEntries": len(self._memory),
+                "storedEntries": stored,
+            }
+
+
+def from_env() -> DescriptionCache:
+    """Build the cache from DESCRIPTION_CACHE_* environment variables"""
+    return DescriptionCache(
+        path=os.getenv("DESCRIPTION_CACHE_PATH", "description_cache.sqlite3"),
+        ttl_seconds=float(os.getenv("DESCRIPTION_CACHE_TTL_HOURS", "720")) * 3600,
+        max_entries=int(os.getenv("DESCRIPTION_CACHE_MAX_ENTRIES", "100000")),
+        memory_entries=int(os.getenv("DESCRIPTION_CACHE_MEMORY_ENTRIES", "5000")),
+    )
@@ -0,0 +1,137 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Exported counterpart of each DescriptionFetcher.stats entry
+STAT_METRICS = {
+    "requests": metrics.GEMINI_REQUESTS,
+    "rateLimited": metrics.GEMINI_RATE_LIMITED,
+    "retries": metrics.GEMINI_RETRIES,
+    "fallbacks": metrics.DESCRIPTION_FALLBACKS,
+    "errors": metrics.GEMINI_ERRORS,
+}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Gemini surfaces quota errors as exceptions whose message mentions 429/quota/rate"""
+    error_msg = str(error).lower()
+    return "429" in error_msg or "quota" in error_msg or "rate" in error_msg
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`.
+
+    `pause()` empties the bucket for a while so every worker backs off together
+    after a 429 instead of hammering an exhausted quota.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._updated = self._paused_until
+
+
+class DescriptionFetcher:
+    """Fetch descriptions concurrently within the Gemini quota.
+
+    Args:
+        generate: callable(url, title) -> str that raises on failure
+        fallback: callable(url, title) -> str used once retries are exhausted
+        concurrency: number of requests in flight at once
+        requests_per_minute: sustained request rate allowed by the quota
+        max_retries: retries per item after a rate-limit error
+        base_delay / max_delay: bounds in seconds for jittered exponential backoff
+    """
+
+    def __init__(self, generate, fallback, concurrency=4, requests_per_minute=10,
+                 max_retries=5, base_delay=2.0, max_delay=60.0):
+        self.generate = generate
+        self.fallback = fallback
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate=requests_per_minute / 60.0, capacity=self.concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "rateLimited": 0, "retries": 0, "fallbacks": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+        STAT_METRICS[name].inc()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spread retries uniformly so workers don't retry in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def fetch_one(self, url: str, title: str = ""):
+        """Return (description, ok); ok is False when the fallback was used"""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                return self.generate(url, title), True
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    logger.warning("Error getting description for %s: %s", url, e)
+                    self._count("errors")
+                    break
+                self._count("rateLimited")
+                if attempt == self.max_retries:
+                    logger.warning("Rate limit persisted for %s. Using fallback description.", url)
+                    break
+                self._count("retries")
+                self.bucket.pause(self._backoff(attempt))
+        self._count("fallbacks")
+        return self.fallback(url, title), False
+
+    def fetch_all(self, items):
+        """Fetch descriptions for a list of (url, title) pairs, preserving order"""
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as pool:
+            return list(pool.map(lambda item: self.fetch_one(*item), items))
+
+
+def from_env(generate, fallback) -> DescriptionFetcher:
+    """Build a fetcher from GEMINI_* environment variables"""
+    return DescriptionFetcher(
+        generate,
+        fallback,
+        concurrency=int(os.getenv("GEMINI_CONCURRENCY", "4")),
+        requests_per_minute=float(os.getenv("GEMINI_RPM", "10")),
+        max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "5")),
+        base_delay=float(os.getenv("GEMINI_BACKOFF_BASE", "2")),
+        max_delay=float(os.getenv("GEMINI_BACKOFF_MAX", "60")),
+    )
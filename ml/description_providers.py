@@ -0,0 +1,135 @@
+"""Description providers: where the text classified for a page comes from.
+
+GeminiProvider asks the LLM (through a DescriptionFetcher) and is bounded by
+network round-trips and quota. LocalProvider builds the text offline from the
+URL and domain plus keywords that past Gemini descriptions of the same
+domain used, learned into a DomainLexicon.
+"""
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+import preprocess
+
+WORD_RE = re.compile(r"[a-z]{3,}")
+
+# Labels that say nothing about what a site is about
+DOMAIN_NOISE = {"www", "com", "org", "net", "edu", "gov", "html", "htm", "php", "aspx", "index", "http", "https"}
+
+
+def domain_of(url: str) -> str:
+    """Lowercase host without www. or port; bare "host/path" URLs are accepted too"""
+    url = (url or "").strip()
+    if url and "//" not in url:
+        url = "//" + url
+    try:
+        netloc = urlparse(url).netloc.lower()
+    except ValueError:
+        return ""
+    netloc = netloc.rsplit("@", 1)[-1].split(":", 1)[0]
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def keywords_of(text: str):
+    """Lowercase words of 3+ letters that are not stop words"""
+    return [word for word in WORD_RE.findall((text or "").lower()) if word not in preprocess.stop_words and word not in DOMAIN_NOISE]
+
+
+class DomainLexicon:
+    """domain -> the words Gemini most often used to describe its pages
+
+    Args:
+        keywords_per_domain: keywords returned for a domain
+        min_samples: descriptions needed before a domain counts as known
+    """
+
+    def __init__(self, keywords_per_domain=15, min_samples=2):
+        self.keywords_per_domain = keywords_per_domain
+        self.min_samples = min_samples
+        self._words = {}
+        self._samples = Counter()
+        self._lock = threading.Lock()
+
+    def learn(self, url: str, description: str):
+        domain = domain_of(url)
+        if not domain or not description:
+            return
+        with self._lock:
+            words = self._words.setdefault(domain, Counter())
+            words.update(set(keywords_of(description)))
+            self._samples[domain] += 1
+            # Keep memory per domain bounded; the tail never makes the top keywords anyway
+            if len(words) > 20 * self.keywords_per_domain:
+                self._words[domain] = Counter(dict(words.most_common(10 * self.keywords_per_domain)))
+
+    def learn_all(self, entries):
+        """Learn from (url, description) pairs, e.g. the description cache's stored Gemini output"""
+        count = 0
+        for url, description in entries:
+            self.learn(url, description)
+            count += 1
+        return count
+
+    def knows(self, url: str) -> bool:
+        with self._lock:
+            return self._samples[domain_of(url)] >= self.min_samples
+
+    def keywords(self, url: str):
+        with self._lock:
+            words = self._words.get(domain_of(url))
+            return [word for word, _ in words.most_common(self.keywords_per_domain)] if words else []
+
+    def stats(self) -> dict:
+        with self._lock:
+            known = sum(1 for samples in self._samples.values() if samples >= self.min_samples)
+            return {"domains": len(self._samples), "knownDomains": known}
+
+
+class DescriptionProvider:
+    """Turns (url, title) pairs into description text for the classifier"""
+
+    name = "base"
+
+    def describe_many(self, items):
+        """Describe [(url, title), ...]
+
+        Returns:
+            list: (description, ok) tuples in input order; ok is False for a fallback
+        """
+        raise NotImplementedError
+
+
+class GeminiProvider(DescriptionProvider):
+    name = "gemini"
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+
+    def describe_many(self, items):
+        return self.fetcher.fetch_all(items)
+
+
+class LocalProvider(DescriptionProvider):
+    """Offline description: domain and URL path words plus the domain's learned keywords
+
+    The title is left out; callers classify "title description" already.
+    """
+
+    name = "local"
+
+    def __init__(self, lexicon: DomainLexicon):
+        self.lexicon = lexicon
+
+    def describe(self, url: str, title: str = "") -> str:
+        try:
+            path = urlparse(url or "").path
+        except ValueError:
+            path = ""
+        words = keywords_of(domain_of(url).replace(".", " ").replace("-", " "))
+        words.extend(keywords_of(path))
+        words.extend(self.lexicon.keywords(url))
+        # Keep first occurrences only, so a keyword repeated in the URL does not dominate
+        return " ".join(dict.fromkeys(words))
+
+    def describe_many(self, items):
+        return [(self.describe(url, title), True) for url, title in items]
@@ -0,0 +1,135 @@
+"""Persistent domain -> category index consulted before descriptions and the model.
+
+Entries come from two places:
+- the training dataset's website_url/Category columns (version "dataset"),
+  trusted whatever model is loaded;
+- /analyze results, as per-category page votes tagged with the model version
+  that produced them. They only count while that model is loaded, and a
+  result from a different model starts the domain's votes over.
+
+A domain resolves to its majority category. Confidence is the mean model
+confidence of the pages in that category, scaled by their share of the
+domain's pages, so a mixed domain (a video site, a news portal) stays below
+the threshold and keeps going through full classification.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from description_providers import domain_of
+
+DATASET_VERSION = "dataset"
+
+
+class DomainIndex:
+    """In-memory dict backed by a SQLite table; lookups never touch the disk
+
+    Args:
+        path: SQLite file
+        min_confidence: resolved confidence (0-100) needed to skip classification
+        min_samples: classified pages needed before an /analyze entry is used
+    """
+
+    def __init__(self, path: str, min_confidence=60.0, min_samples=3):
+        self.path = path
+        self.min_confidence = min_confidence
+        self.min_samples = min_samples
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT PRIMARY KEY,
+                model_version TEXT NOT NULL,
+                votes TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        for domain, version, votes in self._conn.execute("SELECT domain, model_version, votes FROM domains"):
+            self._entries[domain] = {"version": version, "votes": json.loads(votes)}
+
+    @staticmethod
+    def _resolve(votes):
+        """(category, confidence, pages) of a domain's votes {category: [pages, confidence_sum]}"""
+        total = sum(pages for pages, _ in votes.values())
+        category, (_, confidence_sum) = max(votes.items(), key=lambda item: item[1][0])
+        # Mean confidence of the category's pages times their share of all pages
+        return category, confidence_sum / total, total
+
+    def lookup(self, url: str, model_version: str):
+        """(category, confidence) for the URL's domain, or None to classify it normally"""
+        with self._lock:
+            entry = self._entries.get(domain_of(url))
+            resolved = None
+            if entry is not None and entry["version"] in (DATASET_VERSION, model_version):
+                category, confidence, pages = self._resolve(entry["votes"])
+                trusted = entry["version"] == DATASET_VERSION or pages >= self.min_samples
+                if trusted and confidence >= self.min_confidence:
+                    resolved = (category, confidence)
+            if resolved is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return resolved
+
+    def learn(self, results, model_version: str):
+        """Add (url, category, confidence) results from `model_version` and persist the touched domains"""
+        touched = {}
+        with self._lock:
+            for url, category, confidence in results:
+                domain = domain_of(url)
+                if not domain:
+                    continue
+                entry = self._entries.get(domain)
+                if entry is not None and entry["version"] == DATASET_VERSION and model_version != DATASET_VERSION:
+                    # Labelled domains are not overridden by predictions
+                    continue
+                if entry is None or entry["version"] != model_version:
+                    entry = self._entries[domain] = {"version": model_version, "votes": {}}
+                vote = entry["votes"].setdefault(category, [0, 0.0])
+                vote[0] += 1
+                vote[1] += confidence
+                touched[domain] = entry
+            if touched:
+                now = time.time()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO domains (domain, model_version, votes, updated_at) VALUES (?, ?, ?, ?)",
+                    [(domain, entry["version"], json.dumps(entry["votes"]), now) for domain, entry in touched.items()],
+                )
+                self._conn.commit()
+        return len(touched)
+
+    def forget(self, model_version: str):
+        """Drop every entry of one version, e.g. the dataset labels before they are rebuilt"""
+        with self._lock:
+            for domain in [d for d, entry in self._entries.items() if entry["version"] == model_version]:
+                del self._entries[domain]
+            self._conn.execute("DELETE FROM domains WHERE model_version = ?", (model_version,))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            labelled = sum(1 for entry in self._entries.values() if entry["version"] == DATASET_VERSION)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "domains": len(self._entries),
+                "labelledDomains": labelled,
+            }
+
+
+def from_env() -> DomainIndex:
+    """Build the index from DOMAIN_INDEX_* environment variables"""
+    return DomainIndex(
+        path=os.getenv("DOMAIN_INDEX_PATH", "domain_index.sqlite3"),
+        min_confidence=float(os.getenv("DOMAIN_INDEX_MIN_CONFIDENCE", "60")),
+        min_samples=int(os.getenv("DOMAIN_INDEX_MIN_SAMPLES", "3")),
+    )
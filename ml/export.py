@@ -0,0 +1,359 @@
+"""Columnar export of classified activities, partitioned by day.
+
+Each run appends the analyzed activities changed since the previous run to
+    <dir>/date=YYYY-MM-DD/part-NNNNNN.parquet   (zstd)
+or  <dir>/date=YYYY-MM-DD/part-NNNNNN.arrow     (Arrow IPC, uncompressed so it maps zero-copy)
+and records its watermark in <dir>/_state.json. The date is the activity's
+startTime. "Changed" means updatedAt, which every write (analysis,
+compaction) stamps with the Mongo server time. An activity reclassified or
+merged into a session is exported again, and an activity deleted by
+compaction is exported as a row with deleted=true, from its tombstone.
+read_export() keeps only the latest row per activity by default and drops
+the deleted ones.
+
+A write that has just stamped updatedAt may not be visible yet when an
+export reads past it. Each run therefore re-reads the EXPORT_OVERLAP_SECONDS
+before its watermark, and skips rows it already wrote from that window.
+
+Export is at-least-once: if a run stops after writing files but before
+saving the state, the next run writes those rows again and the
+latest-only read drops the duplicates.
+
+Runs share the part numbering and watermarks in the state file, so a run
+holds an exclusive flock on <dir>/_lock from start to finish. A second run
+against the same directory, from another uvicorn worker or the CLI, raises
+ExportRunning instead of overwriting the first one's files.
+
+pyarrow is optional and only needed here:
+    pip install pyarrow
+    python export.py --format parquet
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from database import find_batches
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, runs are only serialized within one process
+    fcntl = None
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "parquet").lower()
+# Rows buffered in memory before they are written out as one file per day
+EXPORT_ROWS_PER_FLUSH = int(os.getenv("EXPORT_ROWS_PER_FLUSH", "100000"))
+# Seconds before the watermark re-read on every run, for writes that were not visible yet
+EXPORT_OVERLAP_SECONDS = float(os.getenv("EXPORT_OVERLAP_SECONDS", "60"))
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+STATE_FILE = "_state.json"
+LOCK_FILE = "_lock"
+
+
+class ExportRunning(Exception):
+    """Raised when another process is exporting to the same directory"""
+
+
+@contextmanager
+def export_lock(directory):
+    """Hold an exclusive, non-blocking flock on the export directory's lock file"""
+    with open(os.path.join(directory, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ExportRunning(f"Another export to {directory} is running")
+        # Closing the file releases the lock
+        yield
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("Columnar export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def export_schema():
+    pa = require_pyarrow()
+    return pa.schema([
+        ("id", pa.string()),
+        ("url", pa.string()),
+        ("title", pa.string()),
+        ("startTime", pa.timestamp("ms")),
+        ("endTime", pa.timestamp("ms")),
+        ("duration", pa.float64()),
+        ("sessionRecords", pa.int64()),
+        ("description", pa.string()),
+        ("category", pa.string()),
+        ("confidence", pa.float64()),
+        ("alternatives", pa.list_(pa.struct([("category", pa.string()), ("probability", pa.float64())]))),
+        ("modelVersion", pa.string()),
+        ("analyzedAt", pa.timestamp("ms")),
+        ("updatedAt", pa.timestamp("ms")),
+        ("deleted", pa.bool_()),
+    ])
+
+
+def export_row(activity):
+    """One activity joined with its stored analysis, as a dict of export columns"""
+    duration = activity.get("duration")
+    return {
+        "id": str(activity["_id"]),
+        "url": activity.get("url"),
+        "title": activity.get("title"),
+        "startTime": activity.get("startTime"),
+        "endTime": activity.get("endTime"),
+        "duration": float(duration) if duration is not None else None,
+        "sessionRecords": activity.get("sessionRecords", 1),
+        "description": activity.get("description"),
+        "category": activity.get("category"),
+        "confidence": activity.get("confidence"),
+        "alternatives": activity.get("alternatives") or [],
+        "modelVersion": activity.get("modelVersion"),
+        "analyzedAt": activity.get("analyzedAt"),
+        "updatedAt": activity.get("updatedAt"),
+        "deleted": False,
+    }
+
+
+def tombstone_row(tombstone):
+    """Export row marking an activity deleted by compaction"""
+    return {
+        "id": str(tombstone["_id"]),
+        "startTime": tombstone.get("startTime"),
+        "updatedAt": tombstone["deletedAt"],
+        "deleted": True,
+    }
+
+
+def partition_of(row):
+    start = row["startTime"]
+    return f"date={start.strftime('%Y-%m-%d')}" if isinstance(start, datetime) else "date=unknown"
+
+
+def load_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        # Per source: the newest updatedAt/deletedAt exported, and {id: time} of the rows within the overlap before it
+        return {"format": None, "files": 0, "rows": 0,
+                "activities": {"watermark": None, "recent": {}},
+                "tombstones": {"watermark": None, "recent": {}}}
+    with open(path) as f:
+        state = json.load(f)
+    if "activities" not in state:
+        raise ValueError(f"{directory} was written by an older exporter (analyzedAt watermark); rebuild it")
+    return state
+
+
+def save_state(directory, state):
+    # Written to a temporary file and renamed, so a crash leaves the old watermark intact
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def changed_since(source, field, overlap):
+    """Filter on `field` from the overlap window before a source's watermark; everything on the first run"""
+    if not source["watermark"]:
+        return {}
+    return {field: {"$gte": datetime.fromisoformat(source["watermark"]) - timedelta(seconds=overlap)}}
+
+
+def already_exported(source, row):
+    return source["recent"].get(row["id"]) == row["updatedAt"].isoformat()
+
+
+def advance(source, rows, overlap):
+    """Move a source's watermark to its newest exported row and remember the rows inside the overlap"""
+    recent = dict(source["recent"])
+    recent.update((row["id"], row["updatedAt"].isoformat()) for row in rows)
+    times = {activity_id: datetime.fromisoformat(updated) for activity_id, updated in recent.items()}
+    newest = max(times.values())
+    if source["watermark"]:
+        newest = max(newest, datetime.fromisoformat(source["watermark"]))
+    since = newest - timedelta(seconds=overlap)
+    source["watermark"] = newest.isoformat()
+    source["recent"] = {activity_id: recent[activity_id] for activity_id, updated in times.items() if updated >= since}
+
+
+def write_partitions(directory, fmt, rows, state):
+    """Write buffered rows as one file per day partition; blocking
+
+    Returns:
+        list: paths written
+    """
+    pa = require_pyarrow()
+    schema = export_schema()
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(partition_of(row), []).append(row)
+    written = []
+    for partition, day_rows in sorted(by_day.items()):
+        os.makedirs(os.path.join(directory, partition), exist_ok=True)
+        path = os.path.join(directory, partition, f"part-{state['files']:06d}.{FORMATS[fmt]}")
+        table = pa.Table.from_pylist(day_rows, schema=schema)
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, path + ".tmp", compression="zstd")
+        else:
+            with pa.OSFile(path + ".tmp", "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(path + ".tmp", path)
+        state["files"] += 1
+        written.append(path)
+    return written
+
+
+async def export_activities(coll, directory=EXPORT_DIR, fmt=EXPORT_FORMAT, rebuild=False,
+                            rows_per_flush=EXPORT_ROWS_PER_FLUSH, tombstone_coll=None,
+                            overlap=EXPORT_OVERLAP_SECONDS):
+    """Append activities changed since the last export to the day-partitioned files
+
+    Args:
+        coll: activities collection
+        directory: export root; holds the partitions and the state file
+        fmt: "parquet" or "arrow"; an existing export keeps the format it was started with
+        rebuild: delete the existing partitions and export everything again
+        tombstone_coll: compaction's tombstones, exported as deleted rows; None skips deletions
+        overlap: seconds before the watermark read again
+
+    Returns:
+        dict: rows and files written by this run, plus the export totals
+
+    Raises:
+        ExportRunning: another process holds the directory's lock
+    """
+    require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use parquet or arrow")
+    os.makedirs(directory, exist_ok=True)
+    with export_lock(directory):
+        return await export_locked(coll, directory, fmt, rebuild, rows_per_flush, tombstone_coll, overlap)
+
+
+async def export_locked(coll, directory, fmt, rebuild, rows_per_flush, tombstone_coll, overlap):
+    if rebuild:
+        for name in os.listdir(directory):
+            if name.startswith("date="):
+                shutil.rmtree(os.path.join(directory, name))
+            elif name == STATE_FILE:
+                os.remove(os.path.join(directory, name))
+    state = load_state(directory)
+    if state["format"] not in (None, fmt):
+        raise ValueError(f"{directory} holds a {state['format']} export; rebuild it to switch formats")
+    state["format"] = fmt
+
+    # Analyzed before writes stamped updatedAt; stamped once so the watermark covers them
+    await coll.update_many({"analyzedAt": {"$ne": None}, "updatedAt": None}, {"$currentDate": {"updatedAt": True}})
+
+    run = {"rows": 0, "files": []}
+
+    async def export_source(name, source_coll, field, query, to_row):
+        source = state[name]
+        rows = []
+
+        async def flush():
+            if not rows:
+                return
+            run["files"].extend(await run_in_threadpool(write_partitions, directory, fmt, rows, state))
+            run["rows"] += len(rows)
+            state["rows"] += len(rows)
+            advance(source, rows, overlap)
+            save_state(directory, state)
+            rows.clear()
+
+        query = {**query, **changed_since(source, field, overlap)}
+        async for batch in find_batches(source_coll, query, sort=[(field, 1), ("_id", 1)]):
+            rows.extend(row for row in map(to_row, batch) if not already_exported(source, row))
+            if len(rows) >= rows_per_flush:
+                await flush()
+        await flush()
+
+    await export_source("activities", coll, "updatedAt", {"analyzedAt": {"$ne": None}}, export_row)
+    if tombstone_coll is not None:
+        await export_source("tombstones", tombstone_coll, "deletedAt", {}, tombstone_row)
+    return {
+        "format": fmt,
+        "directory": os.path.abspath(directory),
+        "rowsWritten": run["rows"],
+        "filesWritten": len(run["files"]),
+        "totalRows": state["rows"],
+        "totalFiles": state["files"],
+        "watermark": state["activities"]["watermark"],
+        "tombstoneWatermark": state["tombstones"]["watermark"],
+    }
+
+
+def read_export(directory=EXPORT_DIR, start=None, end=None, columns=None, latest_only=True):
+    """Load an export as one Arrow table, memory-mapping every file
+
+    Args:
+        start / end (str, optional): first and last day to read, as YYYY-MM-DD
+        columns (list, optional): columns to return; all by default
+        latest_only (bool): keep only the most recent row of each activity, dropping deleted activities
+
+    Returns:
+        pyarrow.Table
+    """
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+
+    read_columns = None
+    if columns:
+        # The latest-only pass needs these even when they are not returned
+        needed = ["id", "updatedAt", "startTime", "deleted"] if latest_only else []
+        read_columns = list(dict.fromkeys(list(columns) + needed))
+    tables = []
+    for partition in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if not partition.startswith("date="):
+            continue
+        day = partition[len("date="):]
+        if (start and day < start) or (end and day > end):
+            continue
+        for name in sorted(os.listdir(os.path.join(directory, partition))):
+            path = os.path.join(directory, partition, name)
+            if name.endswith(".parquet"):
+                tables.append(pq.read_table(path, columns=read_columns, memory_map=True))
+            elif name.endswith(".arrow"):
+                # Zero-copy: the table's buffers point into the mapped file
+                table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+                tables.append(table.select(read_columns) if read_columns else table)
+    if not tables:
+        empty = export_schema().empty_table()
+        tables = [empty.select(read_columns) if read_columns else empty]
+    table = pa.concat_tables(tables)
+    if latest_only and table.num_rows > 1:
+        # Newest row first within each id, then keep the first row of every id unless it is a
+        # tombstone. This also drops the exact duplicates an interrupted run can leave behind.
+        import pyarrow.compute as pc
+        table = table.sort_by([("id", "ascending"), ("updatedAt", "descending")])
+        ids = table["id"].combine_chunks()
+        first = pc.not_equal(ids.slice(1), ids.slice(0, len(ids) - 1))
+        table = table.filter(pa.concat_arrays([pa.array([True]), first]))
+        table = table.filter(pc.invert(table["deleted"]))
+        table = table.sort_by([("startTime", "ascending"), ("id", "ascending")])
+    if columns:
+        table = table.select(columns)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export classified activities to day-partitioned Parquet/Arrow files")
+    parser.add_argument("--dir", default=EXPORT_DIR, help="export directory")
+    parser.add_argument("--format", default=EXPORT_FORMAT, choices=sorted(FORMATS))
+    parser.add_argument("--rebuild", action="store_true", help="delete the existing export and start over")
+    args = parser.parse_args()
+
+    from database import collection, db
+    from compaction import TOMBSTONE_COLLECTION
+    summary = asyncio.run(export_activities(collection, args.dir, args.format, args.rebuild,
+                                            tombstone_coll=db[TOMBSTONE_COLLECTION]))
+    print(json.dumps(summary, indent=2))
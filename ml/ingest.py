@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import deque
+from pymongo.errors import BulkWriteError
+from metrics import STAGE_SECONDS, ACTIVITIES_INGESTED
+
+
+class WriteBehindBuffer:
+    """Bounded in-memory queue of documents written to Mongo in the background.
+
+    submit() only appends to the queue. A flusher task drains it with
+    unordered insert_many calls of up to `flush_size` documents. It flushes as
+    soon as that many are queued, or `flush_interval_ms` after the oldest
+    queued document arrived. When the queue holds `max_pending` documents,
+    submit() refuses new ones so the caller can push back on its clients.
+    A failed flush puts its documents back at the head of the queue and is
+    retried. While Mongo is down the queue fills, and that is the
+    backpressure.
+
+    Accepted documents live only in memory until they are flushed; close()
+    drains the queue on shutdown.
+    """
+
+    def __init__(self, coll, max_pending=50000, flush_size=1000, flush_interval_ms=500, retry_max_seconds=5.0):
+        self.coll = coll
+        self.max_pending = max_pending
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.retry_max = retry_max_seconds
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_error = None
+        # True while Mongo writes are failing and the flusher is backing off
+        self.backing_off = False
+        self._queue = deque()
+        self._oldest = None
+        self._wakeup = None
+        self._worker = None
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def submit(self, documents) -> bool:
+        """Queue documents for writing; False (nothing queued) when they do not fit"""
+        if len(self._queue) + len(documents) > self.max_pending:
+            self.rejected += len(documents)
+            ACTIVITIES_INGESTED.inc(len(documents), result="rejected")
+            return False
+        # Created lazily so the event and flusher belong to the server's running loop
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        was_empty = not self._queue
+        if was_empty:
+            self._oldest = time.monotonic()
+        self._queue.extend(documents)
+        self.accepted += len(documents)
+        ACTIVITIES_INGESTED.inc(len(documents), result="accepted")
+        # Wake an idle flusher so it starts the flush_interval clock, and a waiting one once a batch is full
+        if was_empty or len(self._queue) >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    async def _run(self):
+        delay = self.flush_interval
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self._queue) < self.flush_size:
+                # Give a partial batch until flush_interval after its oldest document to fill up
+                timeout = self._oldest + self.flush_interval - time.monotonic()
+                if timeout > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            if await self._flush_once():
+                delay = self.flush_interval
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+
+    async def _flush_once(self) -> bool:
+        """Write up to flush_size queued documents; False if Mongo could not be reached"""
+        batch = [self._queue.popleft() for _ in range(min(self.flush_size, len(self._queue)))]
+        if not batch:
+            return True
+        self._oldest = time.monotonic() if self._queue else None
+        try:
+            with STAGE_SECONDS.time(stage="ingest_flush"):
+                await self.coll.insert_many(batch, ordered=False)
+            written = len(batch)
+        except asyncio.CancelledError:
+            # Shutting down mid-write; close() writes the batch again (at least once)
+            self._queue.extendleft(reversed(batch))
+            raise
+        except BulkWriteError as e:
+            # Unordered: everything but the rejected documents (e.g. a duplicate _id) was written
+            written = e.details.get("nInserted", 0)
+            self.failed += len(batch) - written
+            ACTIVITIES_INGESTED.inc(len(batch) - written, result="failed")
+            self.last_error = str(e)
+        except Exception as e:
+            # Nothing was written; keep the order and try again after a backoff
+            self._queue.extendleft(reversed(batch))
+            self._oldest = time.monotonic()
+            self.last_error = str(e)
+            print(f"⚠️ Ingest flush failed, {len(self._queue)} activities queued: {e}")
+            self.backing_off = True
+            return False
+        self.backing_off = False
+        self.flushes += 1
+        self.written += written
+        ACTIVITIES_INGESTED.inc(written, result="written")
+        return True
+
+    async def close(self, timeout=10.0):
+        """Flush what is queued (giving up after `timeout` seconds) and stop the flusher"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        deadline = time.monotonic() + timeout
+        while self._queue and time.monotonic() < deadline:
+            if not await self._flush_once():
+                await asyncio.sleep(0.5)
+        if self._queue:
+            print(f"⚠️ {len(self._queue)} ingested activities were not written before shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._queue),
+            "maxPending": self.max_pending,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "backingOff": self.backing_off,
+            "lastError": self.last_error,
+        }
@@ -0,0 +1,187 @@
+"""Background analysis jobs persisted in Mongo.
+
+A job document holds its parameters, status, progress counters and a
+checkpoint written by the runner after every chunk. Jobs run as asyncio
+tasks, at most `workers` at a time per process. Claiming a job is an atomic
+status change, and a running job refreshes `heartbeatAt`, so when several
+uvicorn workers share the collection only one runs each job, and a job
+whose process died is picked up again once its lease expires.
+
+Statuses: queued -> running -> completed | failed | cancelled
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Raised from checkpoint() once cancellation has been requested"""
+
+
+class JobManager:
+    """Run, checkpoint, cancel and resume jobs stored in `coll`
+
+    Args:
+        coll: Motor collection holding the job documents
+        runner: async callable(job, checkpoint) doing the work; it calls
+            `await checkpoint(**fields)` after each unit of work to persist
+            its progress, and resumes from those fields when rerun
+        workers: jobs run concurrently by this process
+        lease_seconds: a running job without a heartbeat for this long is
+            considered abandoned and may be resumed
+    """
+
+    def __init__(self, coll, runner, workers=1, lease_seconds=120):
+        self.coll = coll
+        self.runner = runner
+        self.workers = max(1, workers)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.owner = uuid.uuid4().hex
+        self.tasks = {}
+        self._cancelling = set()
+        self._slots = None
+
+    async def submit(self, params):
+        now = datetime.now()
+        job = {
+            "status": "queued",
+            "params": params,
+            "processed": 0,
+            "total": None,
+            "checkpoint": {},
+            "cancelRequested": False,
+            "error": None,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        result = await self.coll.insert_one(job)
+        job["_id"] = result.inserted_id
+        self._schedule(result.inserted_id)
+        return job
+
+    async def get(self, job_id):
+        return await self.coll.find_one({"_id": ObjectId(job_id)})
+
+    async def recent(self, limit=20):
+        return await self.coll.find({}).sort("createdAt", -1).limit(limit).to_list(length=limit)
+
+    async def cancel(self, job_id):
+        """Request cancellation; the job stops at its next checkpoint (queued jobs stop at once)"""
+        job = await self.coll.find_one_and_update(
+            {"_id": ObjectId(job_id), "status": {"$in": list(ACTIVE_STATUSES)}},
+            {"$set": {"cancelRequested": True, "updatedAt": datetime.now()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            return await self.get(job_id)
+        if job["_id"] in self.tasks:
+            # Running here: stop now rather than at the end of the current chunk
+            self._cancelling.add(job["_id"])
+            self.tasks[job["_id"]].cancel()
+        # Nobody holds a queued job yet, so it can be closed here
+        queued = await self.coll.find_one_and_update(
+            {"_id": job["_id"], "status": "queued"},
+            {"$set": {"status": "cancelled", "finishedAt": datetime.now()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return queued or job
+
+    async def resume(self):
+        """Schedule queued jobs and running jobs whose lease has expired; call on startup"""
+        stale = datetime.now() - self.lease
+        cursor = self.coll.find({"$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeatAt": {"$lt": stale}},
+        ]}, {"_id": 1})
+        job_ids = [job["_id"] for job in await cursor.to_list(length=None)]
+        for job_id in job_ids:
+            self._schedule(job_id)
+        return len(job_ids)
+
+    async def shutdown(self):
+        """Stop this process's jobs and hand them back to the queue for the next start"""
+        for task in self.tasks.values():
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        await self.coll.update_many(
+            {"status": "running", "owner": self.owner},
+            {"$set": {"status": "queued", "updatedAt": datetime.now()}, "$unset": {"owner": ""}},
+        )
+
+    def _schedule(self, job_id):
+        if job_id in self.tasks:
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        task = asyncio.create_task(self._execute(job_id))
+        self.tasks[job_id] = task
+        task.add_done_callback(lambda _: self._forget(job_id))
+
+    def _forget(self, job_id):
+        self.tasks.pop(job_id, None)
+        self._cancelling.discard(job_id)
+
+    async def _claim(self, job_id):
+        now = datetime.now()
+        return await self.coll.find_one_and_update(
+            {"_id": job_id, "cancelRequested": False, "$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeatAt": {"$lt": now - self.lease}},
+            ]},
+            {"$set": {"status": "running", "owner": self.owner, "heartbeatAt": now, "updatedAt": now},
+             "$min": {"startedAt": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            await self.coll.update_one({"_id": job_id, "owner": self.owner},
+                                       {"$set": {"heartbeatAt": datetime.now()}})
+
+    async def _finish(self, job_id, status, error=None):
+        await self.coll.update_one({"_id": job_id, "owner": self.owner}, {"$set": {
+            "status": status,
+            "error": error,
+            "finishedAt": datetime.now(),
+            "updatedAt": datetime.now(),
+        }})
+
+    async def _execute(self, job_id):
+        async with self._slots:
+            job = await self._claim(job_id)
+            if job is None:
+                return
+
+            async def checkpoint(**fields):
+                now = datetime.now()
+                updated = await self.coll.find_one_and_update(
+                    {"_id": job_id, "owner": self.owner},
+                    {"$set": {**fields, "heartbeatAt": now, "updatedAt": now}},
+                    projection={"cancelRequested": 1},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if updated is None or updated.get("cancelRequested"):
+                    raise JobCancelled()
+
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                await self.runner(job, checkpoint)
+                await self._finish(job_id, "completed")
+            except JobCancelled:
+                await self._finish(job_id, "cancelled")
+            except asyncio.CancelledError:
+                if job_id not in self._cancelling:
+                    # Server shutdown; shutdown() requeues the job
+                    raise
+                await self._finish(job_id, "cancelled")
+            except Exception as e:
+                print(f"Analysis job {job_id} failed: {e}")
+                await self._finish(job_id, "failed", str(e))
+            finally:
+                heartbeat.cancel()
@@ -0,0 +1,117 @@
+"""In-process counters and histograms rendered in the Prometheus text format.
+
+Each uvicorn worker keeps its own values; scrape every worker (or run one)
+for complete numbers. Usage:
+
+    with STAGE_SECONDS.time(stage="vectorize"):
+        X = vectorizer.transform(texts)
+    CACHE_LOOKUPS.inc(hits, cache="prediction", result="hit")
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; from a cache hit up to a slow full-history Mongo read
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = []
+
+
+def _label_str(labelnames, values, extra=()):
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Unlabelled counters are exported as 0 before their first increment
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][idx] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the with-block (awaits included)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, [('le', '+Inf')])} {series['count']}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Stages: mongo_fetch, description_fetch, description_local, preprocess, vectorize, predict, shadow_predict,
+# serialize, persist, ingest_flush
+STAGE_SECONDS = Histogram("thirdeye_stage_seconds", "Time spent per analysis stage", ("stage",))
+CACHE_LOOKUPS = Counter("thirdeye_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+ACTIVITIES_ANALYZED = Counter("thirdeye_activities_total", "Activities processed by analysis runs", ("result",))
+GEMINI_REQUESTS = Counter("thirdeye_gemini_requests_total", "Description requests sent to Gemini")
+GEMINI_RATE_LIMITED = Counter("thirdeye_gemini_rate_limited_total", "Gemini requests rejected with a rate-limit (429) error")
+GEMINI_RETRIES = Counter("thirdeye_gemini_retries_total", "Gemini requests retried after a rate-limit error")
+GEMINI_ERRORS = Counter("thirdeye_gemini_errors_total", "Gemini requests failed with a non rate-limit error")
+DESCRIPTIONS = Counter("thirdeye_descriptions_total", "Page descriptions by source (cache, local, gemini, fallback)", ("source",))
+ACTIVITIES_INGESTED = Counter("thirdeye_ingested_activities_total", "Activities through /ingest by result (accepted, rejected, written, failed)", ("result",))
+ACTIVITIES_COMPACTED = Counter("thirdeye_activities_compacted_total", "Activities merged into an earlier session by compaction")
+DESCRIPTION_FALLBACKS = Counter("thirdeye_description_fallbacks_total", "Descriptions that fell back to the title or domain")
+MODEL_RELOADS = Counter("thirdeye_model_reloads_total", "New model versions made active without a restart")
+SHADOW_PREDICTIONS = Counter("thirdeye_shadow_predictions_total", "Shadow candidate predictions by agreement with the active model", ("result",))
@@ -0,0 +1,64 @@
+import asyncio
+from fastapi.concurrency import run_in_threadpool
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item requests into one batched call.
+
+    The first queued item opens a window of `max_wait_ms`; everything that
+    arrives before it closes (up to `max_batch` items) goes to `batch_fn` as
+    one list, which runs on the threadpool so the event loop keeps accepting
+    requests meanwhile.
+    """
+
+    def __init__(self, batch_fn, max_wait_ms=5, max_batch=256):
+        self.batch_fn = batch_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, item):
+        # Created lazily so the queue and worker belong to the server's running loop
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await run_in_threadpool(self.batch_fn, [item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avgBatchSize": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
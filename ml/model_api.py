@@ -0,0 +1,57 @@
+"""/model endpoints and the hot-reload watch, shared by both servers.
+
+Each server mounts them with app.include_router(model_api.router); the
+router's startup and shutdown hooks start and stop the registry's watch.
+"""
+import asyncio
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+import classifier
+import model_registry
+
+router = APIRouter()
+
+model_watch_task = None
+
+
+@router.on_event("startup")
+async def start_model_watch():
+    """Poll for retrained models and swap them in without a restart"""
+    global model_watch_task
+    if model_registry.RELOAD_INTERVAL_SECONDS > 0:
+        model_watch_task = asyncio.create_task(classifier.registry.watch(model_registry.RELOAD_INTERVAL_SECONDS))
+
+
+@router.on_event("shutdown")
+async def stop_model_watch():
+    if model_watch_task is not None:
+        model_watch_task.cancel()
+
+
+@router.get("/model")
+async def model_status():
+    """Active model, shadow candidate and how well the candidate agrees with the active model"""
+    return classifier.registry.stats()
+
+
+@router.post("/model/reload")
+async def reload_model():
+    """Check for new model files now instead of waiting for the next poll"""
+    result = await run_in_threadpool(classifier.registry.check)
+    return {"result": result, **classifier.registry.stats()}
+
+
+@router.post("/model/promote")
+async def promote_model():
+    """Make the shadow candidate the active model"""
+    if classifier.registry.promote() is None:
+        return {"error": "No candidate model"}
+    return classifier.registry.stats()
+
+
+@router.post("/model/discard")
+async def discard_model():
+    """Drop the shadow candidate and keep the active model"""
+    if classifier.registry.discard() is None:
+        return {"error": "No candidate model"}
+    return classifier.registry.stats()
@@ -0,0 +1,293 @@
+"""Active model, hot reload and shadow scoring.
+
+Each server process keeps one ModelRegistry. watch() polls the model files.
+When training (classification.py) or artifact.py writes a new version, the
+registry loads it on a worker thread and swaps it in with a single attribute
+assignment. Requests already running keep the LoadedModel they started with,
+including the stop words it was trained with, so no request mixes two models.
+
+With MODEL_SHADOW_SAMPLE_RATE > 0 a new version first becomes the candidate.
+That share of the texts the active model scores are also scored by the
+candidate, off the request path. The registry records how often the two
+agree and what each costs per text. The candidate is promoted after
+MODEL_SHADOW_PROMOTE_AFTER samples if it agreed at least
+MODEL_SHADOW_MIN_AGREEMENT of the time; otherwise it waits for
+POST /model/promote or /model/discard. A promote-after of 0 means the
+candidate is only promoted by hand.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.concurrency import run_in_threadpool
+import preprocess
+from artifact import ARTIFACT_PATH, load_model
+from preprocess import preprocess_batch
+from scoring import rank_predictions
+from metrics import STAGE_SECONDS, SHADOW_PREDICTIONS, MODEL_RELOADS
+
+PICKLE_PATHS = ("vectorizer.pkl", "model.pkl")
+
+# Seconds between checks for new model files; 0 turns hot reload off
+RELOAD_INTERVAL_SECONDS = float(os.getenv("MODEL_RELOAD_INTERVAL_SECONDS", "30"))
+
+# Shadow batches allowed to wait for the candidate; more are dropped rather than queued
+SHADOW_MAX_PENDING = 4
+
+
+class LoadedModel:
+    """One model version: vectorizer, classifier and the metadata saved with them"""
+
+    def __init__(self, vectorizer, model, version, meta):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.version = version
+        self.meta = meta
+        # Stop words bundled with the artifact match its training run; the pickles carry none and use NLTK's list
+        words = meta.get("stopwords")
+        self.stop_words = frozenset(preprocess.nltk_stop_words() if words is None else words)
+        # Softmax temperature fitted on held-out data at training time; None for uncalibrated models
+        self.temperature = (meta.get("calibration") or {}).get("temperature")
+        self.loaded_at = time.time()
+
+    def preprocess(self, texts):
+        return preprocess_batch(texts, self.stop_words)
+
+    def score(self, processed, alternatives):
+        """rank_predictions() over preprocessed texts: (categories, confidences, alternatives)"""
+        scores = self.model.decision_function(self.vectorizer.transform(processed))
+        return rank_predictions(self.model.classes_, scores, alternatives, self.temperature)
+
+
+def model_signature(path=ARTIFACT_PATH):
+    """(path, mtime, size) of the files load_model() would read; changes when a model is written"""
+    paths = (path,) if os.path.exists(path) else PICKLE_PATHS
+    signature = []
+    for p in paths:
+        try:
+            stat = os.stat(p)
+        except OSError:
+            return None
+        signature.append((p, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class ModelRegistry:
+    """The active model of this process, plus an optional shadow candidate
+
+    Args:
+        path: model artifact (the pickles are watched when it does not exist)
+        shadow_rate: share of scored texts also sent to a candidate; 0 swaps new versions in directly
+        promote_after: shadow samples before automatic promotion; 0 promotes only on request
+        min_agreement: agreement (0-1) a candidate needs to be promoted automatically
+    """
+
+    def __init__(self, path=ARTIFACT_PATH, shadow_rate=0.0, promote_after=1000, min_agreement=0.0):
+        self.path = path
+        self.shadow_rate = shadow_rate
+        self.promote_after = promote_after
+        self.min_agreement = min_agreement
+        self.active = None
+        self.candidate = None
+        self.reloads = 0
+        self.last_error = None
+        self._signature = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._reset_shadow()
+
+    def _reset_shadow(self):
+        self.shadow = {"samples": 0, "agreements": 0, "activeSeconds": 0.0, "candidateSeconds": 0.0}
+
+    def _activate(self, loaded):
+        """Swap `loaded` in; the caller holds the lock"""
+        # Scoring passes each model its own stop words; the defaults only serve the domain lexicon
+        if preprocess.port_stemmer is None or loaded.stop_words != preprocess.stop_words:
+            preprocess.load(loaded.stop_words)
+        previous, self.active = self.active, loaded
+        if self.candidate is loaded:
+            self.candidate = None
+        return previous
+
+    def _promoted(self, loaded, previous):
+        MODEL_RELOADS.inc()
+        print(f"✓ Model {loaded.version} active (was {previous.version if previous else None})")
+
+    def load(self):
+        """Load the current model files as the active model; blocking
+
+        Returns:
+            dict: milliseconds spent per step, empty if a model is already active
+        """
+        with self._lock:
+            if self.active is not None:
+                return {}
+            start = time.perf_counter()
+            signature = model_signature(self.path)
+            loaded = LoadedModel(*load_model(self.path))
+            loaded_at = time.perf_counter()
+            self._activate(loaded)
+            self._signature = signature
+            return {
+                "modelMs": round((loaded_at - start) * 1000, 1),
+                "preprocessMs": round((time.perf_counter() - loaded_at) * 1000, 1),
+            }
+
+    def check(self):
+        """Load the model files if they changed since the last check; blocking
+
+        Returns:
+            str: "unchanged", "promoted" or "shadowing"
+        """
+        signature = model_signature(self.path)
+        if signature is None or signature == self._signature or self.active is None:
+            return "unchanged"
+        try:
+            loaded = LoadedModel(*load_model(self.path))
+        except Exception as e:
+            # Most likely caught mid-write (the pickles are not replaced atomically); retried next tick
+            self.last_error = str(e)
+            return "unchanged"
+        if model_signature(self.path) != signature:
+            return "unchanged"
+        self._signature = signature
+        self.last_error = None
+        with self._lock:
+            if loaded.version == self.active.version:
+                # Rolled back to the active model: nothing to shadow any more
+                self.candidate = None
+                return "unchanged"
+            if self.candidate is not None and loaded.version == self.candidate.version:
+                return "shadowing"
+            if self.shadow_rate > 0:
+                self.candidate = loaded
+                self._reset_shadow()
+                print(f"Model {loaded.version} loaded; shadowing {self.active.version} on {self.shadow_rate:.0%} of texts")
+                return "shadowing"
+            self.candidate = None
+            previous = self._activate(loaded)
+            self.reloads += 1
+        self._promoted(loaded, previous)
+        return "promoted"
+
+    def promote(self):
+        """Make the shadow candidate the active model; None if there is none"""
+        with self._lock:
+            loaded = self.candidate
+            if loaded is None:
+                return None
+            previous = self._activate(loaded)
+            self.reloads += 1
+        self._promoted(loaded, previous)
+        return loaded
+
+    def discard(self):
+        with self._lock:
+            candidate, self.candidate = self.candidate, None
+            return candidate
+
+    def maybe_shadow(self, loaded, texts, processed, categories, active_seconds):
+        """Queue a sample of texts just scored by the active model for the candidate
+
+        Args:
+            texts / processed: the raw texts and their preprocessed form for `loaded`
+        """
+        candidate = self.candidate
+        if candidate is None or loaded is not self.active or not processed:
+            return
+        sample = [i for i in range(len(processed)) if random.random() < self.shadow_rate]
+        if not sample:
+            return
+        with self._lock:
+            if self._pending >= SHADOW_MAX_PENDING:
+                return
+            self._pending += 1
+        if candidate.stop_words != loaded.stop_words:
+            # Re-preprocessed off the request path, so the candidate sees what it was trained on
+            processed = [texts[i] for i in sample]
+            reprocess = True
+        else:
+            processed = [processed[i] for i in sample]
+            reprocess = False
+        self._shadow_pool.submit(self._score_shadow, candidate, processed, reprocess,
+                                 [categories[i] for i in sample], active_seconds * len(sample) / len(texts))
+
+    def _score_shadow(self, candidate, processed, reprocess, expected, active_seconds):
+        try:
+            if reprocess:
+                processed = candidate.preprocess(processed)
+            start = time.perf_counter()
+            with STAGE_SECONDS.time(stage="shadow_predict"):
+                categories, _, _ = candidate.score(processed, 0)
+            elapsed = time.perf_counter() - start
+            agreements = sum(a == b for a, b in zip(categories, expected))
+            SHADOW_PREDICTIONS.inc(agreements, result="agree")
+            SHADOW_PREDICTIONS.inc(len(processed) - agreements, result="disagree")
+            with self._lock:
+                if candidate is not self.candidate:
+                    return
+                self.shadow["samples"] += len(processed)
+                self.shadow["agreements"] += agreements
+                self.shadow["activeSeconds"] += active_seconds
+                self.shadow["candidateSeconds"] += elapsed
+                ready = self.promote_after > 0 and self.shadow["samples"] >= self.promote_after
+                if not ready or self.shadow["agreements"] / self.shadow["samples"] < self.min_agreement:
+                    return
+                # Still under the lock, so a discard in between cannot be undone
+                previous = self._activate(candidate)
+                self.reloads += 1
+            self._promoted(candidate, previous)
+        except Exception as e:
+            self.last_error = f"shadow scoring failed: {e}"
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def watch(self, interval):
+        """Check for new model files every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.check)
+            except Exception as e:
+                print(f"⚠️ Model reload check failed: {e}")
+
+    def stats(self) -> dict:
+        def describe(loaded):
+            if loaded is None:
+                return None
+            return {"version": loaded.version, "loadedAt": loaded.loaded_at,
+                    "calibrated": loaded.temperature is not None}
+
+        with self._lock:
+            shadow = dict(self.shadow)
+            samples = shadow["samples"]
+            return {
+                "active": describe(self.active),
+                "candidate": describe(self.candidate),
+                "reloads": self.reloads,
+                "lastError": self.last_error,
+                "shadow": {
+                    "sampleRate": self.shadow_rate,
+                    "promoteAfter": self.promote_after,
+                    "minAgreement": self.min_agreement,
+                    "samples": samples,
+                    "agreement": round(shadow["agreements"] / samples, 4) if samples else None,
+                    "activeMsPerText": round(shadow["activeSeconds"] * 1000 / samples, 4) if samples else None,
+                    "candidateMsPerText": round(shadow["candidateSeconds"] * 1000 / samples, 4) if samples else None,
+                    "pendingBatches": self._pending,
+                },
+            }
+
+
+def from_env() -> ModelRegistry:
+    """Build the registry from MODEL_* environment variables"""
+    return ModelRegistry(
+        path=ARTIFACT_PATH,
+        shadow_rate=float(os.getenv("MODEL_SHADOW_SAMPLE_RATE", "0")),
+        promote_after=int(os.getenv("MODEL_SHADOW_PROMOTE_AFTER", "1000")),
+        min_agreement=float(os.getenv("MODEL_SHADOW_MIN_AGREEMENT", "0")),
+    )
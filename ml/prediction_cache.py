@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def text_key(preprocessed_text: str) -> bytes:
+    """Cache key for a preprocessed text"""
+    return hashlib.sha1(preprocessed_text.encode("utf-8")).digest()
+
+
+class PredictionCache:
+    """Bounded LRU of (category, confidence) per preprocessed text, for one model version.
+
+    Entries are only valid for the model version they were computed with;
+    asking for a different version drops everything, so a new model never
+    serves its predecessor's predictions.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get_many(self, version, keys):
+        """Cached prediction or None for each key"""
+        with self._lock:
+            self._check_version(version)
+            values = []
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                values.append(value)
+            return values
+
+    def put_many(self, version, items):
+        with self._lock:
+            self._check_version(version)
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "invalidations": self.invalidations,
+                "modelVersion": self.version,
+            }
@@ -0,0 +1,66 @@
+import os
+import re
+from functools import lru_cache
+# Precompiled passes. Lowercasing, turning every non-letter into a separator
+# and splitting on whitespace collapse into a single findall over [a-z]+; the
+# old symbol-stripping pass never matched anything after that and is gone.
+URL_RE = re.compile(r"http\S+")
+WORD_RE = re.compile(r"[a-z]+")
+
+# Set by load(). Importing nltk costs seconds, so it happens on first use (or in a
+# server's warm-up), and the stop words come from the model artifact when it
+# bundles them - no corpus lookup or download on the serving path. Servers pass
+# each model's own stop words to preprocess_batch(); these are the defaults.
+port_stemmer = None
+stop_words = frozenset()
+
+# Word frequencies are heavily Zipfian, so a modest cache covers almost every token
+STEM_CACHE_SIZE = int(os.getenv("PREPROCESS_STEM_CACHE_SIZE", "100000"))
+
+
+def nltk_stop_words():
+    """NLTK's English stop words; the corpus is downloaded only if it is not installed"""
+    import nltk
+    from nltk.corpus import stopwords
+    try:
+        return stopwords.words('english')
+    except LookupError:
+        nltk.download('stopwords', quiet=True)
+        return stopwords.words('english')
+
+
+def load(words=None):
+    """Create the stemmer and set the default stop words (NLTK's list unless `words` is given)"""
+    global port_stemmer, stop_words
+    from nltk.stem.porter import PorterStemmer
+    stop_words = frozenset(nltk_stop_words() if words is None else words)
+    if port_stemmer is None:
+        port_stemmer = PorterStemmer()
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem_token(word):
+    """Stemmed form of a lowercase token; independent of the stop words, so every model shares it"""
+    return port_stemmer.stem(word)
+
+
+def preprocess_tokens(text, words=None):
+    """Tokens of `text` after URL removal, stop-word filtering and stemming
+
+    `words` are the stop words to drop, the defaults set by load() if None.
+    """
+    if port_stemmer is None:
+        load(words)
+    if words is None:
+        words = stop_words
+    return [stem_token(word) for word in WORD_RE.findall(URL_RE.sub(" ", text.lower())) if word not in words]
+
+
+def preprocessing(text):
+    """Transform text using the same preprocessing as training"""
+    return " ".join(preprocess_tokens(text))
+
+
+def preprocess_batch(texts, words=None):
+    """preprocessing() over a list of documents; used by both training and serving"""
+    return [" ".join(preprocess_tokens(text, words)) for text in texts]
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def predict_from_scores(classes, scores):
+    """Turn a decision_function score matrix into categories and confidences.
+
+    Vectorized over the whole batch; matches the per-item confidence formula
+    the services used before:
+      - multi-class: (max - min) / (max - min + 1) * 100, or 95.0 when all scores tie
+      - binary: min(|score| * 10, 99.9)
+
+    Returns:
+        tuple: (list of category names, list of confidence percentages)
+    """
+    classes = np.asarray(classes)
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim == 1:
+        categories = classes[(scores > 0).astype(int)]
+        confidences = np.minimum(np.abs(scores) * 10, 99.9)
+    else:
+        categories = classes[scores.argmax(axis=1)]
+        spread = scores.max(axis=1) - scores.min(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            confidences = np.where(spread != 0, spread / (spread + 1) * 100, 95.0)
+    return categories.tolist(), confidences.tolist()
+
+
+def softmax(scores, temperature=1.0):
+    """Row-wise softmax of scores / temperature; a 1-d (binary) score s becomes logits [0, s]"""
+    scores = np.asarray(scores, dtype=float)
+    if scores.ndim == 1:
+        scores = np.column_stack([np.zeros_like(scores), scores])
+    logits = scores / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+def rank_predictions(classes, scores, alternatives=2, temperature=None):
+    """Category, confidence and runner-up categories for every row, from one score matrix
+
+    With a fitted softmax temperature the confidence is the calibrated
+    probability of the top class (as a percentage) and runner-ups carry
+    probabilities on the same scale. Without one the confidence is the
+    predict_from_scores() formula, which no probability is comparable to,
+    so runner-ups are ranked by score and their probability is None.
+
+    Returns:
+        tuple: (categories, confidences, alternatives), where alternatives holds
+            one list of {"category", "probability"} dicts per row
+    """
+    classes = np.asarray(classes)
+    probabilities = softmax(scores, temperature or 1.0)
+    order = np.argsort(-probabilities, axis=1)[:, :alternatives + 1]
+    top = np.take_along_axis(probabilities, order, axis=1)
+
+    if temperature is None:
+        categories, confidences = predict_from_scores(classes, scores)
+    else:
+        categories = classes[order[:, 0]].tolist()
+        confidences = (top[:, 0] * 100).tolist()
+
+    names = classes[order[:, 1:]].tolist()
+    if temperature is None:
+        runner_up = [[None] * (order.shape[1] - 1)] * len(names)
+    else:
+        runner_up = np.round(top[:, 1:], 4).tolist()
+    ranked = [
+        [{"category": name, "probability": probability} for name, probability in zip(row_names, row_probabilities)]
+        for row_names, row_probabilities in zip(names, runner_up)
+    ]
+    return categories, confidences, ranked
+
+
+def fit_temperature(scores, label_indices):
+    """Softmax temperature minimizing the negative log-likelihood of held-out labels"""
+    from scipy.optimize import minimize_scalar
+
+    label_indices = np.asarray(label_indices)
+    rows = np.arange(len(label_indices))
+
+    def nll(log_temperature):
+        probabilities = softmax(scores, np.exp(log_temperature))
+        return -np.log(np.clip(probabilities[rows, label_indices], 1e-12, None)).mean()
+
+    result = minimize_scalar(nll, bounds=(-6.0, 4.0), method="bounded")
+    return float(np.exp(result.x))
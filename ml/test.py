@@ -1,35 +1,13 @@
 # import streamlit as st
 # from streamlit.components.v1 import html
-import pickle
-import re
-import nltk
-from nltk.stem.porter import PorterStemmer
-from nltk.corpus import stopwords
 
 
-# Download required NLTK data
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt', quiet=True)
-
 # Load the trained model and vectorizer
 print("Loading model...")
-tfidf = pickle.load(open('vectorizer.pkl', 'rb'))
-model = pickle.load(open('model.pkl', 'rb'))
-print("✓ Model loaded successfully!\n")
-
-port_stemmer = PorterStemmer()
-stop_words = set(stopwords.words('english'))
-
-def preprocessing(text):
-    """Transform text using the same preprocessing as training"""
-    text = text.lower()
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"[^a-zA-Z]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r'[^\w\s,.!?]', '', text)
-    text = text.split()
-    text = [port_stemmer.stem(word) for word in text if not word in stop_words]
-    return " ".join(text)
+import classifier
+from classifier import classify_batch
+classifier.load()
+print(f"✓ Model loaded successfully! (version {classifier.MODEL_VERSION})\n")
 
 def predict_category(text):
     """
@@ -41,32 +19,8 @@ def predict_category(text):
     Returns:
         tuple: (category_name, confidence_score)
     """
-    # Preprocess text
-    preprocessed_text = preprocessing(text)
-    
-    # Vectorize
-    vectorized_text = tfidf.transform([preprocessed_text])
-    
-    # Predict
-    category_name = model.predict(vectorized_text)[0]
-    
-    # Get decision function scores for confidence (LinearSVC doesn't have predict_proba)
-    decision_scores = model.decision_function(vectorized_text)[0]
-    
-    # Calculate confidence as percentage (normalize decision scores)
-    if len(decision_scores.shape) > 0 and len(decision_scores) > 1:
-        # Multi-class: use max decision score
-        max_score = max(decision_scores)
-        min_score = min(decision_scores)
-        if max_score != min_score:
-            confidence = ((max_score - min_score) / (max_score - min_score + 1)) * 100
-        else:
-            confidence = 95.0
-    else:
-        # Binary or single score
-        confidence = min(abs(decision_scores) * 10, 99.9)
-    
-    return category_name, confidence
+    category, confidence, _ = classify_batch([text])[0]
+    return category, confidence
 
 # Test with example website texts
 if __name__ == "__main__":
@@ -104,13 +58,17 @@ if __name__ == "__main__":
     
     print("\nPredefined Test Cases:")
     print("-" * 60)
-    for idx, test in enumerate(test_cases, 1):
-        category, confidence = predict_category(test["text"])
+    predictions = classify_batch([test["text"] for test in test_cases])
+    for idx, (test, (category, confidence, alternatives)) in enumerate(zip(test_cases, predictions), 1):
         print(f"\nTest {idx}:")
         print(f"  Input: {test['text']}")
         print(f"  Expected: {test.get('expected', 'Unknown')}")
         print(f"  Predicted: {category}")
         print(f"  Confidence: {confidence:.2f}%")
+        if alternatives:
+            runner_up = ", ".join(alt['category'] if alt['probability'] is None else f"{alt['category']} ({alt['probability']:.0%})"
+                                  for alt in alternatives)
+            print(f"  Alternatives: {runner_up}")
     
     print("\n" + "=" * 60)
     print("Interactive Mode - Enter your own website text")
@@ -0,0 +1,62 @@
+"""Tests for the /ingest write-behind buffer, against an in-memory Mongo.
+
+    pip install pytest mongomock-motor
+    python -m pytest -q test_ingest.py
+"""
+import asyncio
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from ingest import WriteBehindBuffer
+
+
+def activities(count, offset=0):
+    return [{"url": f"https://example.com/{offset + i}", "duration": 1} for i in range(count)]
+
+
+def new_buffer(**kwargs):
+    coll = mongomock_motor.AsyncMongoMockClient()["test"]["activities"]
+    return coll, WriteBehindBuffer(coll, **kwargs)
+
+
+def test_partial_batch_flushed_after_interval():
+    async def run():
+        coll, buffer = new_buffer(flush_size=1000, flush_interval_ms=50)
+        assert buffer.submit(activities(2))
+        await asyncio.sleep(0.2)
+        assert await coll.count_documents({}) == 2
+
+        # The queue went idle after the first flush; a later partial batch must still be written on time
+        assert buffer.submit(activities(1, offset=2))
+        await asyncio.sleep(0.2)
+        assert buffer.pending == 0
+        assert await coll.count_documents({}) == 3
+        await buffer.close()
+
+    asyncio.run(run())
+
+
+def test_full_batch_flushed_without_waiting():
+    async def run():
+        coll, buffer = new_buffer(flush_size=10, flush_interval_ms=60000)
+        assert buffer.submit(activities(10))
+        await asyncio.sleep(0.05)
+        assert await coll.count_documents({}) == 10
+        assert buffer.stats()["flushes"] == 1
+        await buffer.close()
+
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_and_close_drains():
+    async def run():
+        coll, buffer = new_buffer(max_pending=5, flush_size=100, flush_interval_ms=60000)
+        assert buffer.submit(activities(5))
+        assert not buffer.submit(activities(1, offset=5))
+        assert buffer.stats()["rejected"] == 1
+        await buffer.close()
+        assert buffer.pending == 0
+        assert await coll.count_documents({}) == 5
+
+    asyncio.run(run())
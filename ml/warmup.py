@@ -0,0 +1,55 @@
+"""Deferred server initialization behind /healthz and /readyz.
+
+Importing a server module only wires up routes and configuration; loading
+the model, NLTK and the Gemini client runs once in a worker thread started
+from the startup hook. The process answers liveness probes immediately and
+reports ready once the warm-up has finished. Requests that need the model
+before then wait for the same warm-up instead of starting their own.
+"""
+import asyncio
+import time
+from fastapi.concurrency import run_in_threadpool
+
+
+class Warmup:
+    """Runs `initialize` (a blocking callable returning {step: ms}) once, off the event loop"""
+
+    def __init__(self, initialize):
+        self.initialize = initialize
+        self.timings = {}
+        self.error = None
+        self._task = None
+
+    def start(self):
+        """Begin warming up in the background; a failed warm-up is retried on the next call"""
+        if self._task is None or (self._task.done() and self.error is not None):
+            self._task = asyncio.ensure_future(self._run())
+        return self._task
+
+    async def _run(self):
+        start = time.perf_counter()
+        self.error = None
+        try:
+            timings = await run_in_threadpool(self.initialize) or {}
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Warm-up failed: {e}")
+            return
+        timings["totalMs"] = round((time.perf_counter() - start) * 1000, 1)
+        self.timings = timings
+        steps = ", ".join(f"{step} {ms}ms" for step, ms in timings.items())
+        print(f"✓ Warm-up finished ({steps})")
+
+    async def wait(self):
+        """Return once warm, raising if the warm-up failed"""
+        # Shielded so a cancelled request does not cancel the shared warm-up
+        await asyncio.shield(self.start())
+        if self.error is not None:
+            raise RuntimeError(f"Warm-up failed: {self.error}")
+
+    @property
+    def ready(self) -> bool:
+        return self._task is not None and self._task.done() and not self._task.cancelled() and self.error is None
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "error": self.error, "timings": self.timings}